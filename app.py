@@ -1,75 +1,44 @@
 from __future__ import print_function
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from dash import Dash, no_update
+from dash import Dash, callback_context, no_update
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 import dash_table
 import dash_auth
-from dash.dependencies import Input, Output
-from flask import Flask
+from dash.dependencies import ClientsideFunction, Input, Output
+from flask import Flask, Response, abort, request, stream_with_context
 import fohr_theme_light
-import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
-import json
+import time
+from urllib.parse import urlencode
 from tables import bonus_col, bonus_cell_cond, bonus_data_cond
+import datastore
+import rollup
+import figures
+import datatable
+import export
+import metrics
+from schema import SCHEMA_VERSION, clean_rows, concat, memory_report
+import cache
+from cache import memoize
+from refresher import REFRESH_INTERVAL, start_refresher
+from sheets import (gsheet_to_df, restore_sync_state, source_identity,
+                    sync_google_sheet, sync_state)
 
 CELL_PADDING = 15
 DATA_PADDING = 15
 TABLE_PADDING = 100
 FONTSIZE = 12
 
+# Rows of the activity table sent to the browser at a time; filtering,
+# sorting and paging happen on the server.
+MAIN_TABLE_PAGE_SIZE = 50
 
-# If modifying these scopes, delete the file token.pickle.
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
-
-# The ID and range of a google spreadsheet.
-SPREADSHEET_ID = os.environ['SPREADSHEET_ID']
-RANGE_NAME = os.environ['RANGE_NAME']
-CREDS = os.environ['GDRIVE_AUTH']
-
-
-def get_google_sheet():
-    """
-    Returns all values from the target google sheet.
-    Prints values from a sample spreadsheet.
-    """
-    service_account_info = json.loads(CREDS)
-    creds = service_account.Credentials.from_service_account_info(
-        service_account_info)
-
-    service = build('sheets', 'v4', credentials=creds)
-
-    # Call the Sheets API
-    sheet = service.spreadsheets()
-    result = sheet.values().get(spreadsheetId=SPREADSHEET_ID,
-                                range=RANGE_NAME).execute()
-    values = result.get('values', [])
-
-    if not values:
-        print('No data found.')
-    else:
-        return values
-
-
-def gsheet_to_df(values):
-    """ 
-    Converts Google sheet API data to Pandas DataFrame
-
-    Input: Google API service.spreadsheets().get() values
-    Output: Pandas DataFrame with all data from Google Sheet
-    """
-    header = values[0]
-    rows = values[1:]
-    if not rows:
-        print('No data found.')
-    else:
-        df = pd.DataFrame(columns=header, data=rows)
-    return df
+# Log the memory used by each column whenever a new snapshot is stored.
+MEMORY_REPORT = os.environ.get('MEMORY_REPORT') == '1'
 
 
 def clean_main_data():
@@ -78,52 +47,36 @@ def clean_main_data():
     Repeating this data step to allow for two separate date configurations:
         1. Main date range selected by the user.
         2. This date range which returns specific quarter-year time frames
+    The cleaned frame is stored as the latest datastore snapshot and its
+    key is returned. After the first pull only appended rows are cleaned
+    and added to the previous snapshot.
+    Workers sharing a cache backend take turns: a snapshot another worker
+    stored within the last half REFRESH_INTERVAL is reused as is.
+    Each new snapshot is also saved to disk for the next startup.
     """
-    gsheet = get_google_sheet()
-    df = gsheet_to_df(gsheet)
-    df.columns = ['timestamp',
-                  'brand_developer',
-                  'event_name',
-                  'date',
-                  'Location City (closest)',
-                  'Location State',
-                  'Location Zip Code',
-                  'activation_type',
-                  'discipline',
-                  'demo_retailer',
-                  'demo_bob',
-                  'clinic_retailer',
-                  'clinic_shop_level',
-                  'clinic_staff_count',
-                  'festival_retail_partner',
-                  'festival_total_attendance',
-                  'festival_bob',
-                  'vip_retailer',
-                  'vip_total_attendance',
-                  'vip_bob',
-                  'trail_building_retailer',
-                  'trail_building_total_attendance',
-                  'shop_assist_retailer',
-                  'shop_assist_description',
-                  'other_activation_retailer',
-                  'other_activation_description',
-                  'other_activation_bob',
-                  'latitude',
-                  'longitude']
-    df['date'] = pd.to_datetime(df.date)
-    df['Week'] = df['date'].dt.isocalendar().week
-    df['quarter'] = df['date'].dt.quarter.astype(str)
-    df['year'] = df['date'].dt.year.astype(str)
-    df['year_quarter'] = df['year'] + " Q" + df['quarter']
-    integers = ['demo_bob', 'festival_bob', 'vip_bob',
-                'other_activation_bob', 'clinic_staff_count',
-                'festival_total_attendance',
-                'vip_total_attendance',
-                'trail_building_total_attendance']
-    df[integers] = df[integers].replace(
-        '', 0).replace('None', 0).astype(int)
-    df = df.replace('', np.nan).replace('None', np.nan)
-    return df.to_json(date_format='iso', orient='split')
+    with cache.lock('sheet-refresh'):
+        info = datastore.latest_info()
+        if info and time.time() - info['at'] < REFRESH_INTERVAL / 2:
+            return info['key']
+        if info:
+            restore_sync_state(info['sync'])
+        values, full = sync_google_sheet()
+        if full:
+            df = clean_rows(gsheet_to_df(values))
+        elif len(values) > 1:
+            df = concat([datastore.get(info['key']),
+                         clean_rows(gsheet_to_df(values))])
+        else:
+            df = datastore.get(info['key'])
+        key = datastore.put(df, sync=sync_state())
+        datastore.save_snapshot(SCHEMA_VERSION, source_identity())
+        rollup.cube(key)
+        if MEMORY_REPORT:
+            report = memory_report(df)
+            print(f'Snapshot {key}: {len(df)} rows, '
+                  f'{report.bytes.sum() / 1e6:.1f} MB')
+            print(report.to_string())
+        return key
 
 
 server = Flask(__name__)
@@ -138,568 +91,485 @@ app = Dash(name=__name__,
 
 app.config.suppress_callback_exceptions = False
 auth = dash_auth.BasicAuth(app, VALID_USERNAME_PASSWORD_PAIRS)
+metrics.track_requests(server, app)
 
-app.layout = html.Div(
-    html.Div([
-        dbc.Row(
-            dbc.Col([
-                html.Img(id="wordmark",
-                         src="./assets/fiction_bicycles.png",
-                         alt="Fictional Bicycle company logo",
-                         style={
-                             'width': '100%',
-                             'padding left': "0px"
-                         })
-            ],  width={"size": 6, "offest": 0}), justify="left"
-        ),
-        dcc.Markdown("""
-                # Field Marketing Tracker
-                ---
-                -  Select date range
-                -  Click legend names on map to isolate activation types
-                """,
-                     style={
-                         'font-family': 'plain light',
-                         'color': 'grey',
-                         'font-weight': 'light'
-                     }),
-        html.Br(),
-        html.Label('Date Range',
-                   style={
-                       'font-family': 'plain',
-                       'font-weight': 'light'
-                   }),
-        html.Br(),
-        html.Br(),
-        dcc.DatePickerRange(id='dt-picker-range',
-                            start_date=datetime.now() - timedelta(days=90),
-                            end_date=datetime.now()),
-        html.Br(),
-        dbc.Row([
-                dbc.Col(
-                    html.H2('Total Butts on Bikes',
-                            style={
-                                'font-family': 'plain',
-                                'font-weight': 'light',
-                                'color': 'grey',
-                                'text-align': 'center',
-                                'font-size': 24,
-                            }),
-                    align="center", width=3),
-                dbc.Col(
-                    html.H2('Total Activations:',
-                            style={
-                                'font-family': 'plain',
-                                'font-weight': 'light',
-                                'color': 'grey',
-                                'font-size': 24,
-                                'textAlign': 'center'
-                            }),
-                    align="center", width=3),
-                dbc.Col(
-                    html.H2('Total Staff Educated:',
-                            style={
-                                'font-family': 'plain',
-                                'font-weight': 'light',
-                                'color': 'grey',
-                                'font-size': 24,
-                                'text-align': 'center'
-                            }),
-                    align="center", width=3),
-                ], justify='center', align='center', style={'padding-top': 80}),
-        dbc.Row([
-                dbc.Col(
-                    html.H1(id='label_total_bob',
-                               style={
-                                   'font-family': 'plain light',
-                                   'font-weight': 'light',
-                                   'font-size': 36,
-                                   'padding': 0,
-                                   'textAlign': 'center'
-                               }), align="center", width=3),
-                dbc.Col(
-                    html.H1(id='label_total_activations',
-                               style={
-                                   'font-family': 'plain light',
-                                   'font-weight': 'light',
-                                   'font-size': 36,
-                                   'padding': 0,
-                                   'textAlign': 'center'
-                               }), align="center", width=3),
-                dbc.Col(
-                    html.H1(id='label_total_staff',
-                               style={
-                                   'font-family': 'plain light',
-                                   'font-weight': 'light',
-                                   'font-size': 36,
-                                   'padding': 0,
-                                   'textAlign': 'center'
-                               }), align="center", width=3),
-                ], justify='center'),
-        html.Br(),
-        dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id='main_map', style={'height': '800px'})
-                ])
-                ]),
-        html.Br(),
-        html.Br(),
-        dcc.Markdown("""
-                # Filtered Map
-                ---
-                -  Use this map to filter specific BD's or riding disciplines
-                -  Select one or more from either dropdown below
-                """,
-                     style={
-                         'font-family': 'plain light',
-                         'color': 'grey',
-                         'font-weight': 'light'
-                     }),
-        html.Br(),
-        html.Br(),
-        dbc.Row([
+
+@ server.route('/metrics')
+def prometheus_metrics():
+    """ Callback timings, payload sizes and cache results for Prometheus. """
+    if not auth.is_authorized():
+        return auth.login_request()
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+def serve_layout():
+    """
+    Builds the page layout around the latest data snapshot.
+    Called on every page load so refreshed sheet data is picked up
+    without restarting the server.
+    """
+    return html.Div(
+        html.Div([
+            dbc.Row(
                 dbc.Col([
-                    html.Label('Brand Developer(s)',
-                               style={
-                                   'font-family': 'plain',
-                                   'font-weight': 'light'
-                               }),
-                    dcc.Dropdown(id='BD Dropdown',
-                                 options=[{
-                                     'label': 'All BDs',
-                                     'value': 'All BDs'
-                                 }],
-                                 value=['All BDs'],
-                                 multi=True,
-                                 style={
-                                     'font-family': 'plain',
-                                     'font-weight': 'light',
-                                     'width': '300px'
-                                 })
-                ],
-                    width=4),
+                    html.Img(id="wordmark",
+                             src="./assets/fiction_bicycles.png",
+                             alt="Fictional Bicycle company logo",
+                             style={
+                                 'width': '100%',
+                                 'padding left': "0px"
+                             })
+                ],  width={"size": 6, "offest": 0}), justify="left"
+            ),
+            dcc.Markdown("""
+                    # Field Marketing Tracker
+                    ---
+                    -  Select date range
+                    -  Click legend names on map to isolate activation types
+                    """,
+                         style={
+                             'font-family': 'plain light',
+                             'color': 'grey',
+                             'font-weight': 'light'
+                         }),
+            html.Br(),
+            html.Label('Date Range',
+                       style={
+                           'font-family': 'plain',
+                           'font-weight': 'light'
+                       }),
+            html.Br(),
+            html.Br(),
+            # date_slice leaves out the end date, so the default range
+            # ends tomorrow to include today's events.
+            dcc.DatePickerRange(id='dt-picker-range',
+                                start_date=(datetime.now().date()
+                                            - timedelta(days=90)),
+                                end_date=(datetime.now().date()
+                                          + timedelta(days=1))),
+            html.Br(),
+            dbc.Row([
+                    dbc.Col(
+                        html.H2('Total Butts on Bikes',
+                                style={
+                                    'font-family': 'plain',
+                                    'font-weight': 'light',
+                                    'color': 'grey',
+                                    'text-align': 'center',
+                                    'font-size': 24,
+                                }),
+                        align="center", width=3),
+                    dbc.Col(
+                        html.H2('Total Activations:',
+                                style={
+                                    'font-family': 'plain',
+                                    'font-weight': 'light',
+                                    'color': 'grey',
+                                    'font-size': 24,
+                                    'textAlign': 'center'
+                                }),
+                        align="center", width=3),
+                    dbc.Col(
+                        html.H2('Total Staff Educated:',
+                                style={
+                                    'font-family': 'plain',
+                                    'font-weight': 'light',
+                                    'color': 'grey',
+                                    'font-size': 24,
+                                    'text-align': 'center'
+                                }),
+                        align="center", width=3),
+                    ], justify='center', align='center', style={'padding-top': 80}),
+            dbc.Row([
+                    dbc.Col(
+                        html.H1(id='label_total_bob',
+                                   style={
+                                       'font-family': 'plain light',
+                                       'font-weight': 'light',
+                                       'font-size': 36,
+                                       'padding': 0,
+                                       'textAlign': 'center'
+                                   }), align="center", width=3),
+                    dbc.Col(
+                        html.H1(id='label_total_activations',
+                                   style={
+                                       'font-family': 'plain light',
+                                       'font-weight': 'light',
+                                       'font-size': 36,
+                                       'padding': 0,
+                                       'textAlign': 'center'
+                                   }), align="center", width=3),
+                    dbc.Col(
+                        html.H1(id='label_total_staff',
+                                   style={
+                                       'font-family': 'plain light',
+                                       'font-weight': 'light',
+                                       'font-size': 36,
+                                       'padding': 0,
+                                       'textAlign': 'center'
+                                   }), align="center", width=3),
+                    ], justify='center'),
+            html.Br(),
+            dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id='main_map', style={'height': '800px'})
+                    ])
+                    ]),
+            html.Br(),
+            html.Br(),
+            dcc.Markdown("""
+                    # Filtered Map
+                    ---
+                    -  Use this map to filter specific BD's or riding disciplines
+                    -  Select one or more from either dropdown below
+                    """,
+                         style={
+                             'font-family': 'plain light',
+                             'color': 'grey',
+                             'font-weight': 'light'
+                         }),
+            html.Br(),
+            html.Br(),
+            dbc.Row([
+                    dbc.Col([
+                        html.Label('Brand Developer(s)',
+                                   style={
+                                       'font-family': 'plain',
+                                       'font-weight': 'light'
+                                   }),
+                        dcc.Dropdown(id='BD Dropdown',
+                                     options=[{
+                                         'label': 'All BDs',
+                                         'value': 'All BDs'
+                                     }],
+                                     value=['All BDs'],
+                                     multi=True,
+                                     style={
+                                         'font-family': 'plain',
+                                         'font-weight': 'light',
+                                         'width': '300px'
+                                     })
+                    ],
+                        width=4),
+                    dbc.Col([
+                        html.Label('Ride Type(s)',
+                                   style={
+                                       'font-family': 'plain',
+                                       'font-weight': 'light'
+                                   }),
+                        dcc.Dropdown(id='Ride Type Dropdown',
+                                     options=[{
+                                         'label': 'All',
+                                         'value': 'All'
+                                     }],
+                                     value=['All'],
+                                     multi=True,
+                                     style={
+                                         'font-family': 'plain',
+                                         'font-weight': 'light',
+                                         'width': '300px'
+                                     })
+                    ],
+                        width=4)
+                    ]),
+            html.Br(),
+            dbc.Row([
+                    dbc.Col(
+                        html.H2('Total Butts on Bikes',
+                                style={
+                                    'font-family': 'plain',
+                                    'font-weight': 'light',
+                                    'color': 'grey',
+                                    'text-align': 'center',
+                                    'font-size': 24,
+                                    'textAlign': 'center'
+                                }),
+                        align="center", width=3),
+                    dbc.Col(
+                        html.H2('Total Activations:',
+                                style={
+                                    'font-family': 'plain',
+                                    'font-weight': 'light',
+                                    'color': 'grey',
+                                    'font-size': 24,
+                                    'textAlign': 'center'
+                                }),
+                        align="center", width=3),
+                    dbc.Col(
+                        html.H2('Total Staff Educated:',
+                                style={
+                                    'font-family': 'plain',
+                                    'font-weight': 'light',
+                                    'color': 'grey',
+                                    'font-size': 24,
+                                    'textAlign': 'center'
+                                }),
+                        align="center", width=3),
+                    ], justify='center', style={'padding-top': 100}),
+            dbc.Row([
+                    dbc.Col(
+                        html.H1(id='label_filtered_bob',
+                                   style={
+                                       'font-family': 'plain light',
+                                       'font-weight': 'light',
+                                       'font-size': 36,
+                                       'padding': 0,
+                                       'textAlign': 'center'
+                                   }), align="center", width=3),
+                    dbc.Col(
+                        html.H1(id='label_filtered_activations',
+                                   style={
+                                       'font-family': 'plain light',
+                                       'font-weight': 'light',
+                                       'font-size': 36,
+                                       'padding': 0,
+                                       'textAlign': 'center'
+                                   }), align="center", width=3),
+                    dbc.Col(
+                        html.H1(id='label_filtered_staff',
+                                   style={
+                                       'font-family': 'plain light',
+                                       'font-weight': 'light',
+                                       'font-size': 36,
+                                       'padding': 0,
+                                       'textAlign': 'center'
+                                   }), align="center", width=3),
+                    ], style={'t-padding': 0}, justify='center'),
+            dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id='second_map', style={'height': '800px'})
+                    ])
+                    ]),
+            dcc.Markdown("""
+                    # Bonus Tracker
+                    ---
+                    -  Choose Quarter from dropdown
+                    -  Highlighted cells have met bonus criteria
+                    -  Select BD in table to see individual bar charts
+                    """,
+                         style={
+                             'font-family': 'plain light',
+                             'color': 'grey',
+                             'font-weight': 'light'
+                         }),
+            html.Br(),
+            html.Br(),
+            dbc.Row(
                 dbc.Col([
-                    html.Label('Ride Type(s)',
-                               style={
-                                   'font-family': 'plain',
-                                   'font-weight': 'light'
-                               }),
-                    dcc.Dropdown(id='Ride Type Dropdown',
-                                 options=[{
-                                     'label': 'All',
-                                     'value': 'All'
-                                 }],
-                                 value=['All'],
-                                 multi=True,
-                                 style={
-                                     'font-family': 'plain',
-                                     'font-weight': 'light',
-                                     'width': '300px'
-                                 })
-                ],
-                    width=4)
-                ]),
-        html.Br(),
-        dbc.Row([
-                dbc.Col(
-                    html.H2('Total Butts on Bikes',
-                            style={
-                                'font-family': 'plain',
-                                'font-weight': 'light',
-                                'color': 'grey',
-                                'text-align': 'center',
-                                'font-size': 24,
-                                'textAlign': 'center'
-                            }),
-                    align="center", width=3),
-                dbc.Col(
-                    html.H2('Total Activations:',
-                            style={
-                                'font-family': 'plain',
-                                'font-weight': 'light',
-                                'color': 'grey',
-                                'font-size': 24,
-                                'textAlign': 'center'
-                            }),
-                    align="center", width=3),
-                dbc.Col(
-                    html.H2('Total Staff Educated:',
-                            style={
-                                'font-family': 'plain',
-                                'font-weight': 'light',
-                                'color': 'grey',
-                                'font-size': 24,
-                                'textAlign': 'center'
-                            }),
-                    align="center", width=3),
-                ], justify='center', style={'padding-top': 100}),
-        dbc.Row([
-                dbc.Col(
-                    html.H1(id='label_filtered_bob',
-                               style={
-                                   'font-family': 'plain light',
-                                   'font-weight': 'light',
-                                   'font-size': 36,
-                                   'padding': 0,
-                                   'textAlign': 'center'
-                               }), align="center", width=3),
-                dbc.Col(
-                    html.H1(id='label_filtered_activations',
-                               style={
-                                   'font-family': 'plain light',
-                                   'font-weight': 'light',
-                                   'font-size': 36,
-                                   'padding': 0,
-                                   'textAlign': 'center'
-                               }), align="center", width=3),
+                        html.Label("Quarter:",
+                                   style={
+                                       'font-family': 'plain',
+                                       'font-weight': 'light'
+                                   }),
+                        dcc.Dropdown(id='quarter_dropdown',
+                                     options=[
+                                         {'label': '2020 Q3', 'value': '2020 Q3'}],
+                                     value='2020 Q3',
+                                     multi=False,
+                                     style={
+                                         'font-family': 'plain light',
+                                         'font-weight': 'light',
+                                         'padding': 2
+                                     })
+                        ], width=4)
+            ),
+            html.Br(),
+            dbc.Row(
                 dbc.Col(
-                    html.H1(id='label_filtered_staff',
-                               style={
-                                   'font-family': 'plain light',
-                                   'font-weight': 'light',
-                                   'font-size': 36,
-                                   'padding': 0,
-                                   'textAlign': 'center'
-                               }), align="center", width=3),
-                ], style={'t-padding': 0}, justify='center'),
-        dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id='second_map', style={'height': '800px'})
-                ])
-                ]),
-        dcc.Markdown("""
-                # Bonus Tracker
-                ---
-                -  Choose Quarter from dropdown
-                -  Highlighted cells have met bonus criteria
-                -  Select BD in table to see individual bar charts
-                """,
-                     style={
-                         'font-family': 'plain light',
-                         'color': 'grey',
-                         'font-weight': 'light'
-                     }),
-        html.Br(),
-        html.Br(),
-        dbc.Row(
-            dbc.Col([
-                    html.Label("Quarter:",
-                               style={
-                                   'font-family': 'plain',
-                                   'font-weight': 'light'
-                               }),
-                    dcc.Dropdown(id='quarter_dropdown',
-                                 options=[
-                                     {'label': '2020 Q3', 'value': '2020 Q3'}],
-                                 value='2020 Q3',
-                                 multi=False,
-                                 style={
-                                     'font-family': 'plain light',
-                                     'font-weight': 'light',
-                                     'padding': 2
-                                 })
-                    ], width=4)
-        ),
-        html.Br(),
-        dbc.Row(
-            dbc.Col(
-                dash_table.DataTable(
-                    id='bonus_table',
-                    columns=bonus_col,
-                    data=[],
-                    virtualization=False,
-                    page_action='none',
-                    sort_action="native",
-                    sort_mode="single",
-                    row_selectable='multi',
-                    row_deletable=False,
-                    style_cell={
-                        'fontSize': FONTSIZE,
-                        'padding': CELL_PADDING,
-                    },
-                    style_header={
-                        'backgroundColor': 'white',
-                        'fontWeight': 'bold',
-                        'font-family': 'plain',
-                        'textAlign': 'center',
-                        'padding': CELL_PADDING,
-                    },
-                    style_cell_conditional=bonus_cell_cond,
-                    style_data={
-                        'whiteSpace': 'normal',
-                        'font-family': 'plain light',
-                        'font-weight': 'light',
-                        'color': 'grey',
-                        'padding': DATA_PADDING,
-                    },
-                    style_data_conditional=bonus_data_cond,
-                    style_table={
-                        'page_size': 10,
-                        'minWidth': 10,
-                        'padding': TABLE_PADDING
-                    },
-                    style_as_list_view=True,
-                    export_columns='visible',
-                    export_format='csv'
-                )
-            )
-        ),
-        dbc.Row([
-                dbc.Col([
-                    dcc.Graph(
-                        id='total_bob_bar',
-                    )
-                ], width=6),
-                dbc.Col([
-                    dcc.Graph(
-                        id='activations_bar',
-                    )
-                ], width=6)
-                ]),
-        dbc.Row([
-                dbc.Col([
-                    dcc.Graph(
-                        id='clinics_bar',
-                    )
-                ], width=6),
-                dbc.Col([
-                    dcc.Graph(
-                        id='trail_bar',
+                    dash_table.DataTable(
+                        id='bonus_table',
+                        columns=bonus_col,
+                        data=[],
+                        virtualization=False,
+                        page_action='none',
+                        sort_action="native",
+                        sort_mode="single",
+                        row_selectable='multi',
+                        row_deletable=False,
+                        style_cell={
+                            'fontSize': FONTSIZE,
+                            'padding': CELL_PADDING,
+                        },
+                        style_header={
+                            'backgroundColor': 'white',
+                            'fontWeight': 'bold',
+                            'font-family': 'plain',
+                            'textAlign': 'center',
+                            'padding': CELL_PADDING,
+                        },
+                        style_cell_conditional=bonus_cell_cond,
+                        style_data={
+                            'whiteSpace': 'normal',
+                            'font-family': 'plain light',
+                            'font-weight': 'light',
+                            'color': 'grey',
+                            'padding': DATA_PADDING,
+                        },
+                        style_data_conditional=bonus_data_cond,
+                        style_table={
+                            'page_size': 10,
+                            'minWidth': 10,
+                            'padding': TABLE_PADDING
+                        },
+                        style_as_list_view=True,
+                        export_columns='visible',
+                        export_format='csv'
                     )
-                ], width=6)
-                ]),
-        dcc.Markdown("""
-                # Export all data:
-                ---
-                -  Set date range at the top of the page
-                -  Use sort buttons and the filter row to organize data as you 
-                -  Export .csv file of all activities
-                """,
-                     style={
-                         'font-family': 'plain light',
-                         'color': 'grey',
-                         'font-weight': 'light'
-                     }),
-        html.Br(),
-        dbc.Row(
-            dbc.Col(
-                dash_table.DataTable(
-                    id='main_table',
-                    columns=[],
-                    data=[],
-                    virtualization=True,
-                    page_action='none',
-                    filter_action="native",
-                    sort_action="native",
-                    sort_mode="single",
-                    row_selectable=False,
-                    row_deletable=False,
-                    style_cell={
-                        'fontSize': 10,
-                        'padding': CELL_PADDING,
-                    },
-                    style_header={
-                        'backgroundColor': 'white',
-                        'fontWeight': 'bold',
-                        'font-family': 'plain',
-                        'textAlign': 'center',
-                        'padding': CELL_PADDING,
-                    },
-                    style_cell_conditional=bonus_cell_cond,
-                    style_data={
-                        'whiteSpace': 'normal',
-                        'font-family': 'plain light',
-                        'font-weight': 'light',
-                        'color': 'grey',
-                        'padding': DATA_PADDING,
-                    },
-                    style_data_conditional=bonus_data_cond,
-                    style_table={
-                        'overflowX': 'scroll',
-                        'height': '500px',
-                        'page_size': 10,
-                        'minWidth': 10,
-                        'padding': TABLE_PADDING
-                    },
-                    fixed_rows={'headers': True},
-                    style_as_list_view=True,
-                    export_columns='visible',
-                    export_format='csv'
                 )
-            )
-        ),
-        dbc.Row(
-            dbc.Col([
-                html.Img(id="Logo",
-                         src="./assets/bikelogo.png",
-                         alt="Bicycle Rider logo",
+            ),
+            dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(
+                            id='total_bob_bar',
+                        )
+                    ], width=6),
+                    dbc.Col([
+                        dcc.Graph(
+                            id='activations_bar',
+                        )
+                    ], width=6)
+                    ]),
+            dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(
+                            id='clinics_bar',
+                        )
+                    ], width=6),
+                    dbc.Col([
+                        dcc.Graph(
+                            id='trail_bar',
+                        )
+                    ], width=6)
+                    ]),
+            dcc.Markdown("""
+                    # Export all data:
+                    ---
+                    -  Set date range at the top of the page
+                    -  Use sort buttons and the filter row to organize data as you 
+                    -  Export .csv file of the activities on the current page
+                    -  Or download every activity in the date range, for the BDs and disciplines picked for the map above
+                    """,
                          style={
-                             'height': '60%'
+                             'font-family': 'plain light',
+                             'color': 'grey',
+                             'font-weight': 'light'
                          }),
-            ], width={"size": 2, "offset": 5}),
-        ),
-        html.Div(id='intermediate_value_main',
-                 children=clean_main_data(),
-                 style={'display': 'none'}),
-        html.Div(id='intermediate_value_date', style={'display': 'none'}),
-        html.Div(id='intermediate_value_quarter',
-                 style={'display': 'none'}),
-    ]
-    ), style={"padding": "100px"})
-
-
-@ app.callback([
-    Output('label_total_bob', 'children'),
-    Output('label_total_activations', 'children'),
-    Output('label_total_staff', 'children')],
-    [Input('intermediate_value_date', 'children')]
-)
-def label_totals(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    total_bob = df[['demo_bob', 'festival_bob', 'vip_bob',
-                    'other_activation_bob']].sum().sum()
-    total_bob_text = f'''{total_bob}'''
-    total_activations = len(df)
-    total_activations_text = f'''{total_activations}'''
-    total_staff = df['clinic_staff_count'].sum()
-    total_staff_text = f'''{total_staff}'''
-    return total_bob_text, total_activations_text, total_staff_text
-
-
-@ app.callback(
-    Output('main_map', 'figure'),
-    [Input('intermediate_value_date', 'children')]
-)
-def build_main_map(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    scale = .07
-    main = [('demo_bob', "Demo"),
-            ('clinic_staff_count', "Clinic"),
-            ('festival_bob', 'Festival'),
-            ('vip_bob', 'VIP Event'),
-            ('trail_building_total_attendance', "Trail Day"),
-            ('other_activation_bob', 'Other Test Rides')]
-    fig = go.Figure()
-    for i in main:
-        key = i[0]
-        name = i[1]
-        fig.add_trace(go.Scattergeo(
-            lon=df.loc[df[key] > 0, 'longitude'],
-            lat=df.loc[df[key] > 0, 'latitude'],
-            text=df.loc[df[key] > 0, 'brand_developer'],
-            customdata=df[key].loc[df[key] > 0],
-            marker=dict(
-                size=df[key].loc[df[key] > 0]/scale,
-                # color = colors[i],
-                line_color='rgb(40,40,40)',
-                line_width=0.9,
-                sizemode='area'
+            html.Div([
+                html.A('Download .csv', id='export_csv', href=''),
+                ' | ',
+                html.A('Download .parquet', id='export_parquet', href=''),
+            ],
+                style={
+                    'font-family': 'plain light',
+                    'color': 'grey',
+                    'font-weight': 'light'
+            }),
+            html.Br(),
+            dbc.Row(
+                dbc.Col(
+                    dash_table.DataTable(
+                        id='main_table',
+                        columns=[],
+                        data=[],
+                        page_action='custom',
+                        page_current=0,
+                        page_size=MAIN_TABLE_PAGE_SIZE,
+                        filter_action='custom',
+                        filter_query='',
+                        sort_action='custom',
+                        sort_mode="single",
+                        sort_by=[],
+                        row_selectable=False,
+                        row_deletable=False,
+                        style_cell={
+                            'fontSize': 10,
+                            'padding': CELL_PADDING,
+                        },
+                        style_header={
+                            'backgroundColor': 'white',
+                            'fontWeight': 'bold',
+                            'font-family': 'plain',
+                            'textAlign': 'center',
+                            'padding': CELL_PADDING,
+                        },
+                        style_cell_conditional=bonus_cell_cond,
+                        style_data={
+                            'whiteSpace': 'normal',
+                            'font-family': 'plain light',
+                            'font-weight': 'light',
+                            'color': 'grey',
+                            'padding': DATA_PADDING,
+                        },
+                        style_data_conditional=bonus_data_cond,
+                        style_table={
+                            'overflowX': 'scroll',
+                            'height': '500px',
+                            'page_size': 10,
+                            'minWidth': 10,
+                            'padding': TABLE_PADDING
+                        },
+                        fixed_rows={'headers': True},
+                        style_as_list_view=True,
+                        export_columns='visible',
+                        export_format='csv'
+                    )
+                )
             ),
-            hovertemplate="BD: <b>%{text}</b><br><br>" +
-            "Audience: %{customdata}<br>" +
-            '<extra></extra>',
-            name=name
-        )
-        )
-    fig.add_trace(go.Scattergeo(
-        lon=df.loc[~df['shop_assist_retailer'].isnull(),
-                   'longitude'],
-        lat=df.loc[~df['shop_assist_retailer'].isnull(), 'latitude'],
-        text=df.loc[~df['shop_assist_retailer'].isnull(),
-                    'brand_developer'],
-        customdata=df['shop_assist_retailer'].loc[~df['shop_assist_retailer'].isnull()],
-        marker=dict(
-            symbol='star-diamond',
-            size=10,
-            # color = colors[i],
-            line_color='rgb(40,40,40)',
-            line_width=0.9,
-            sizemode='area'
-        ),
-        hovertemplate="BD: <b>%{text}</b><br><br>" +
-        "Shop Name: %{customdata}<br>" +
-        '<extra></extra>',
-        name="Shop Assist"
-    )
-    )
-    fig.update_layout(
-        plot_bgcolor='Black',
-        showlegend=True,
-        geo=dict(
-            bgcolor='black',
-            resolution=110,
-            scope='usa',
-            landcolor='white',
-            showland=True,
-            showocean=False,
-            showcoastlines=True,
-        )
-    )
-    return fig
-
-
-@ app.callback(
-    Output('BD Dropdown', 'options'),
-    [Input('intermediate_value_date', 'children')]
-)
-def build_BD_dropdown(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    LIST = [{'label': 'All BDs', 'value': 'All BDs'}]
-    TEMP = list(df['brand_developer'].unique())
-    for i in TEMP:
-        LIST.append({"label": i, "value": i})
-    return LIST
-
-
-@ app.callback(
-    Output('Ride Type Dropdown', 'options'),
-    [Input('intermediate_value_date', 'children')]
-)
-def build_ride_type_dropdown(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    LIST = [{'label': 'All', 'value': 'All'}]
-    TEMP = list(df['discipline'].unique())
-    for i in TEMP:
-        LIST.append({"label": i, "value": i})
-    return LIST
-
-
-@ app.callback([
-    Output('label_filtered_bob', 'children'),
-    Output('label_filtered_activations', 'children'),
-    Output('label_filtered_staff', 'children')],
-    [Input('intermediate_value_date', 'children'),
-     Input('BD Dropdown', 'value'),
-     Input('Ride Type Dropdown', 'value')]
-)
-def label_filtered_bob(jsonified_cleaned_data, BD, ride_type):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    if BD == ['All BDs']:
-        BD = list(df['brand_developer'].unique())
-    if ride_type == ['All']:
-        ride_type = list(df['discipline'].unique())
-    df = df.loc[(df['brand_developer'].isin(BD)) &
-                (df['discipline'].isin(ride_type))]
-
-    filtered_bob = df[['demo_bob', 'festival_bob', 'vip_bob',
-                       'other_activation_bob']].sum().sum()
-    filtered_bob_text = f'''{filtered_bob}'''
-    filtered_activations = len(df)
-    filtered_activations_text = f'''{filtered_activations}'''
-    filtered_staff = df['clinic_staff_count'].sum()
-    filtered_staff_text = f'''{filtered_staff}'''
-    return filtered_bob_text, filtered_activations_text, filtered_staff_text
-
-
-@ app.callback(
-    Output('second_map', 'figure'),
-    [Input('intermediate_value_date', 'children'),
-     Input('BD Dropdown', 'value'),
-     Input('Ride Type Dropdown', 'value')]
-)
-def build_second_map(jsonified_cleaned_data, BD, ride_type):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    scale = .07
+            dbc.Row(
+                dbc.Col([
+                    html.Img(id="Logo",
+                             src="./assets/bikelogo.png",
+                             alt="Bicycle Rider logo",
+                             style={
+                                 'height': '60%'
+                             }),
+                ], width={"size": 2, "offset": 5}),
+            ),
+            html.Div(id='intermediate_value_main',
+                     children=datastore.latest(),
+                     style={'display': 'none'}),
+            html.Div(id='intermediate_value_date', style={'display': 'none'}),
+            dcc.Store(id='date_summary'),
+            html.Div(id='intermediate_value_quarter',
+                     style={'display': 'none'}),
+        ]
+        ), style={"padding": "100px"})
+
+
+# Serve the saved snapshot straight away and reconcile it with the sheet in
+# the background; only pull the sheet before serving if there is none.
+# Under gunicorn's preload_app this runs once before the workers fork, so
+# they share the snapshot and its cube (see gunicorn.conf.py).
+if (datastore.latest() is None
+        and datastore.load_snapshot(SCHEMA_VERSION, source_identity()) is None):
+    clean_main_data()
+rollup.cube(datastore.latest())
+start_refresher(clean_main_data, immediately=True)
+
+app.layout = serve_layout
+
+
+@metrics.instrumented
+@memoize
+def date_summary(data_key):
+    return rollup.summary(data_key)
+
+
+@metrics.instrumented
+@memoize
+def build_main_map(data_key):
+    df = datastore.get(data_key)
+    return figures.main_map(df)
+
+
+@metrics.instrumented
+@memoize
+def build_second_map(data_key, BD, ride_type):
+    df = datastore.get(data_key)
+    # Keep every event when the map is narrowed to a single BD or discipline.
+    single = ((len(BD) == 1 and BD != ['All BDs'])
+              or (len(ride_type) == 1 and ride_type != ['All']))
     if BD == ['All BDs']:
         BD = list(df['brand_developer'].unique())
     if ride_type == ['All']:
@@ -707,102 +577,18 @@ def build_second_map(jsonified_cleaned_data, BD, ride_type):
     df = df.loc[(df['brand_developer'].isin(BD)) &
                 (df['discipline'].isin(ride_type))]
 
-    df['agg'] = df[['demo_bob', 'clinic_staff_count', 'festival_total_attendance',
-                    'festival_bob', 'vip_total_attendance', 'vip_bob',
-                    'other_activation_bob']].sum(axis=1)
-
-    fig = go.Figure()
-    scale = .1
-    for i in ride_type:
-        fig.add_trace(go.Scattergeo(
-            lon=df.loc[df['discipline'] == i, 'longitude'],
-            lat=df.loc[df['discipline'] == i, 'latitude'],
-            text=df.loc[df['discipline'] == i, 'brand_developer'],
-            customdata=df['agg'].loc[df['discipline'] == i],
-            marker=dict(
-                size=df['agg'].loc[df['discipline'] == i]/scale,
-                # color = colors[i],
-                line_color='rgb(40,40,40)',
-                line_width=0.9,
-                sizemode='area'
-            ),
-            hovertemplate="BD: <b>%{text}</b><br><br>" +
-            "Audience: %{customdata}<br>" +
-            '<extra></extra>',
-            name=i
-        )
-        )
-    fig.add_trace(go.Scattergeo(
-        lon=df.loc[~df['shop_assist_retailer'].isnull(),
-                   'longitude'],
-        lat=df.loc[~df['shop_assist_retailer'].isnull(), 'latitude'],
-        text=df.loc[~df['shop_assist_retailer'].isnull(),
-                    'brand_developer'],
-        customdata=df['shop_assist_retailer'].loc[~df['shop_assist_retailer'].isnull()],
-        marker=dict(
-            symbol='star-diamond',
-            size=10,
-            color="#FF6692",
-            line_color='rgb(40,40,40)',
-            line_width=0.9,
-            sizemode='area'
-        ),
-        hovertemplate="BD: <b>%{text}</b><br><br>" +
-        "Shop Name: %{customdata}<br>" +
-        '<extra></extra>',
-        name="Shop Assist"
-    )
-    )
-    fig.update_layout(
-        plot_bgcolor='Black',
-        showlegend=True,
-        geo=dict(
-            bgcolor='black',
-            resolution=110,
-            scope='usa',
-            landcolor='white',
-            showland=True,
-            showocean=False,
-            showcoastlines=True,
-        )
-    )
-    return fig
-
-
-@ app.callback(
-    Output('quarter_dropdown', 'options'),
-    [Input('intermediate_value_date', 'children')]
-)
-def build_quater_dropdown(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    LIST = [{'label': '2020 Q3', 'value': '2020 Q3'}]
-    TEMP = list(df['year_quarter'].unique())
-    for i in TEMP:
-        LIST.append({"label": i, "value": i})
-    return LIST
+    return figures.discipline_map(df, ride_type,
+                                  binned=False if single else None)
 
 
 @ app.callback(
     Output('bonus_table', 'data'),
     [Input('intermediate_value_quarter', 'children')]
 )
-def build_bonus_table(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    clinics = df.loc[df['activation_type'] == 'Clinic'].groupby(
-        ['brand_developer']).agg({'event_name': 'count'})
-    activations = df.loc[(df['activation_type'] != 'Clinic') & (
-        df['activation_type'] != 'Trail Day')].groupby(['brand_developer']).agg({'event_name': 'count'})
-    trail_day = df.loc[df['activation_type'] == 'Trail building day'].groupby(
-        ['brand_developer']).agg({'event_name': 'count'})
-    df = pd.DataFrame(data={'brand_developer': list(df.brand_developer),
-                            'total_bob': list(df[['demo_bob', 'festival_bob', 'vip_bob', 'other_activation_bob']].sum(axis=1))
-                            }
-                      ).set_index('brand_developer')
-    df = df.groupby('brand_developer').sum()
-    df = df.join(clinics, rsuffix='clinics')
-    df = df.join(activations, rsuffix='activation')
-    df = df.join(trail_day, rsuffix='trail_day')
-    df.columns = ['total_bob', 'clinics', 'activation', 'trail_day']
+@metrics.instrumented
+@memoize
+def build_bonus_table(data_key):
+    df = rollup.bonus_metrics(rollup.cube(data_key), 'brand_developer')
     df.reset_index(inplace=True)
     df = df.to_dict('records')
     return df
@@ -818,104 +604,215 @@ def build_bonus_table(jsonified_cleaned_data):
      Input('bonus_table', 'derived_virtual_selected_rows'),
      Input('bonus_table', 'selected_rows')]
 )
-def build_bar(jsonified_cleaned_data, all_rows_data, slctd_row_indices, slctd_rows):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
+@metrics.instrumented
+@memoize
+def build_bar(data_key, all_rows_data, slctd_row_indices, slctd_rows):
+    cube = rollup.cube(data_key)
     bd_name = "All"
     if slctd_row_indices:
         bd_name = (all_rows_data[slctd_row_indices[0]]['brand_developer'])
-        df = df.loc[df['brand_developer'] == bd_name]
-    clinics = df.loc[df['activation_type'] == 'Clinic'].groupby(
-        ['Week']).agg({'event_name': 'count'})
-    activations = df.loc[(df['activation_type'] != 'Clinic') & (
-        df['activation_type'] != 'Trail Day')].groupby(['Week']).agg({'event_name': 'count'})
-    trail_day = df.loc[df['activation_type'] == 'Trail building day'].groupby(
-        ['Week']).agg({'event_name': 'count'})
-    df = pd.DataFrame(data={'Week': list(df.Week),
-                            'total_bob': list(df[['demo_bob', 'festival_bob', 'vip_bob', 'other_activation_bob']].sum(axis=1))
-                            }
-                      ).set_index('Week')
-    df = df.groupby('Week').sum()
-    df = df.join(clinics, rsuffix='clinics')
-    df = df.join(activations, rsuffix='activation')
-    df = df.join(trail_day, rsuffix='trail_day')
-    df.columns = ['total_bob', 'clinics', 'activation', 'trail_day']
+        cube = cube.loc[cube['brand_developer'] == bd_name]
+    df = rollup.bonus_metrics(cube, 'Week')
     df = df.fillna(0)
+    return figures.bar_charts(df, bd_name)
 
-    fig1 = go.Figure()
-    fig1.add_trace(
-        go.Bar(
-            x=df.index,
-            y=df.total_bob,
-            marker_color='rgba(168, 168, 168, 0.7)',
-            name='Total B.O.B.',
-            text=df.total_bob,
-            textposition='auto',
-            hovertemplate='<b>Week</b>:   %{x}' +
-                          '<br>Count:  %{y}')
-    )
-    fig1.update_layout(title=f'Total Butts on Bikes - {bd_name}')
-    fig1.update_xaxes(title='Week', showgrid=False, zeroline=False)
-    fig1.update_yaxes(showgrid=False, showticklabels=False, zeroline=False)
-
-    fig2 = go.Figure()
-    fig2.add_trace(
-        go.Bar(
-            x=df.index,
-            y=df.activation,
-            name='Total Activations',
-            marker_color='#19d3f3',
-            text=df.activation,
-            textposition='auto',
-            hovertemplate='<b>Week</b>:   %{x}' +
-                          '<br>Count:  %{y}')
-    )
-    fig2.update_layout(title=f'Total Activations - {bd_name}')
-    fig2.update_xaxes(title='Week', showgrid=False, zeroline=False)
-    fig2.update_yaxes(showgrid=False, showticklabels=False, zeroline=False)
-
-    fig3 = go.Figure()
-    fig3.add_trace(
-        go.Bar(
-            x=df.index,
-            y=df.clinics,
-            name='Total Activations',
-            marker_color='#00cc96',
-            text=df.clinics,
-            textposition='auto',
-            hovertemplate='<b>Week</b>:   %{x}' +
-                          '<br>Count:  %{y}')
-    )
-    fig3.update_layout(title=f'Total Clinics - {bd_name}')
-    fig3.update_xaxes(title='Week', showgrid=False, zeroline=False)
-    fig3.update_yaxes(showgrid=False, showticklabels=False, zeroline=False)
-
-    fig4 = go.Figure()
-    fig4.add_trace(
-        go.Bar(
-            x=df.index,
-            y=df.trail_day,
-            name='Total Trail Days',
-            marker_color='#ab63fa',
-            text=df.trail_day,
-            textposition='auto',
-            hovertemplate='<b>Week</b>:   %{x}' +
-                          '<br>Count:  %{y}')
-    )
-    fig4.update_layout(title=f'Total Trail Building Days - {bd_name}')
-    fig4.update_xaxes(title='Week', showgrid=False, zeroline=False)
-    fig4.update_yaxes(showgrid=False, showticklabels=False, zeroline=False)
-    return fig1, fig2, fig3, fig4
-
-
-@ app.callback([
-    Output('main_table', 'data'),
-    Output('main_table', 'columns'), ],
-    [Input('intermediate_value_date', 'children')]
-)
-def build_main_table(jsonified_cleaned_data):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
+
+@metrics.instrumented
+@memoize
+def build_main_table(data_key, page_current, page_size, sort_by, filter_query):
+    df = datastore.get(data_key)
     columns = [{"name": i, "id": i} for i in df.columns]
-    return df.to_dict('records'), columns
+    rows = datatable.sort_frame(datatable.filter_frame(df, filter_query),
+                                sort_by)
+    page_count = datatable.page_count(rows, page_size)
+    rows = datatable.page(rows, page_current, page_size)
+    return rows.to_dict('records'), columns, page_count
+
+
+# Everything that follows the date range, as (builder, outputs, inputs).
+# update_date_outputs calls each builder with its inputs' values and returns
+# the outputs in this order.
+DATE_OUTPUTS = [
+    (date_summary,
+     [Output('date_summary', 'data')],
+     [Input('intermediate_value_date', 'children')]),
+    (build_main_map,
+     [Output('main_map', 'figure')],
+     [Input('intermediate_value_date', 'children')]),
+    (build_second_map,
+     [Output('second_map', 'figure')],
+     [Input('intermediate_value_date', 'children'),
+      Input('BD Dropdown', 'value'),
+      Input('Ride Type Dropdown', 'value')]),
+    (build_main_table,
+     [Output('main_table', 'data'),
+      Output('main_table', 'columns'),
+      Output('main_table', 'page_count')],
+     [Input('intermediate_value_date', 'children'),
+      Input('main_table', 'page_current'),
+      Input('main_table', 'page_size'),
+      Input('main_table', 'sort_by'),
+      Input('main_table', 'filter_query')]),
+]
+
+DATE_INPUTS = []
+for _, _, inputs in DATE_OUTPUTS:
+    for i in inputs:
+        if i not in DATE_INPUTS:
+            DATE_INPUTS.append(i)
+
+
+@ app.callback([o for _, outputs, _ in DATE_OUTPUTS for o in outputs],
+               DATE_INPUTS)
+@metrics.instrumented
+def update_date_outputs(*values):
+    """
+    Builds every output that depends on the date slice in one request.
+    Only the builders whose inputs changed run; the other outputs are left
+    as they are. Each builder is instrumented on its own, so the metrics
+    break the time down per output.
+    """
+    values = dict(zip(map(str, DATE_INPUTS), values))
+    changed = {t['prop_id'] for t in callback_context.triggered}
+    results = []
+    for builder, outputs, inputs in DATE_OUTPUTS:
+        if '.' not in changed and not changed & set(map(str, inputs)):
+            results += [no_update] * len(outputs)
+            continue
+        built = builder(*[values[str(i)] for i in inputs])
+        results += list(built) if len(outputs) > 1 else [built]
+    return results
+
+
+# A new date range, sort or filter starts the activity table over at its
+# first page. Done in the browser, as page_current is also one of
+# update_date_outputs' inputs.
+app.clientside_callback(
+    ClientsideFunction('table', 'first_page'),
+    Output('main_table', 'page_current'),
+    [Input('intermediate_value_date', 'children'),
+     Input('main_table', 'sort_by'),
+     Input('main_table', 'filter_query')])
+
+
+# The dropdown options and KPI labels only format the date_summary store,
+# so the browser fills them in (assets/clientside.js).
+app.clientside_callback(
+    ClientsideFunction('summary', 'totals'),
+    [Output('label_total_bob', 'children'),
+     Output('label_total_activations', 'children'),
+     Output('label_total_staff', 'children')],
+    [Input('date_summary', 'data')])
+
+app.clientside_callback(
+    ClientsideFunction('summary', 'filtered_totals'),
+    [Output('label_filtered_bob', 'children'),
+     Output('label_filtered_activations', 'children'),
+     Output('label_filtered_staff', 'children')],
+    [Input('date_summary', 'data'),
+     Input('BD Dropdown', 'value'),
+     Input('Ride Type Dropdown', 'value')])
+
+app.clientside_callback(
+    ClientsideFunction('summary', 'bd_options'),
+    Output('BD Dropdown', 'options'),
+    [Input('date_summary', 'data')])
+
+app.clientside_callback(
+    ClientsideFunction('summary', 'discipline_options'),
+    Output('Ride Type Dropdown', 'options'),
+    [Input('date_summary', 'data')])
+
+app.clientside_callback(
+    ClientsideFunction('summary', 'quarter_options'),
+    Output('quarter_dropdown', 'options'),
+    [Input('date_summary', 'data')])
+
+
+def date_slice(df, start_date, end_date):
+    """
+    Returns the rows of a date-sorted frame strictly between two dates.
+    The bounds are found by binary search and the rows are a slice of df,
+    not a copy.
+    """
+    dates = df['date'].values
+    lo = dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), 'right')
+    hi = dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), 'left')
+    return df.iloc[lo:hi]
+
+
+def day(value):
+    """ Returns a date or datetime (or ISO string of one) as 'YYYY-MM-DD'. """
+    if not value:
+        return value
+    return pd.Timestamp(value).date().isoformat()
+
+
+def quarter_slice(df, quarter):
+    """
+    Returns the rows of a date-sorted frame in a year_quarter such as
+    '2020 Q3', found by binary search like date_slice.
+    """
+    try:
+        period = pd.Period(quarter.replace(' ', ''), freq='Q')
+    except (AttributeError, ValueError):
+        return df.iloc[:0]
+    dates = df['date'].values
+    lo = dates.searchsorted(np.datetime64(period.start_time), 'left')
+    hi = dates.searchsorted(np.datetime64((period + 1).start_time), 'left')
+    return df.iloc[lo:hi]
+
+
+datastore.register_view('date', date_slice)
+datastore.register_view('quarter', quarter_slice)
+
+
+@ server.route('/export/activities.<fmt>')
+def export_activities(fmt):
+    """
+    Streams the activities strictly between the start_date and end_date
+    query parameters, from any of the bd and discipline parameters given,
+    as CSV or Parquet. Rows are sent in chunks straight from the latest
+    sheet snapshot.
+    """
+    if not auth.is_authorized():
+        return auth.login_request()
+    if fmt not in export.FORMATS:
+        abort(404)
+    df = datastore.get(datastore.latest())
+    if request.args.get('start_date') and request.args.get('end_date'):
+        df = date_slice(df, request.args['start_date'],
+                        request.args['end_date'])
+    # A parameter left out keeps every value; an empty one ('bd=') none.
+    rows = export.select_rows(df, request.args.getlist('bd') or None,
+                              request.args.getlist('discipline') or None)
+    try:
+        chunks = export.stream(df, rows, fmt)
+    except ImportError:
+        abort(404)
+    return Response(stream_with_context(chunks),
+                    mimetype=export.FORMATS[fmt],
+                    headers={'Content-Disposition':
+                             f'attachment; filename=activities.{fmt}'})
+
+
+@ app.callback(
+    [Output('export_csv', 'href'),
+     Output('export_parquet', 'href')],
+    [Input('dt-picker-range', 'start_date'),
+     Input('dt-picker-range', 'end_date'),
+     Input('BD Dropdown', 'value'),
+     Input('Ride Type Dropdown', 'value')]
+)
+@metrics.instrumented
+def build_export_links(start_date, end_date, BD, ride_type):
+    # An empty dropdown is sent as an empty value, so it exports nothing,
+    # as the map shows nothing.
+    query = urlencode({'start_date': start_date, 'end_date': end_date,
+                       'bd': BD or [''], 'discipline': ride_type or ['']},
+                      doseq=True)
+    return [app.get_relative_path(f'/export/activities.{fmt}?{query}')
+            for fmt in ['csv', 'parquet']]
 
 
 @ app.callback(
@@ -923,11 +820,11 @@ def build_main_table(jsonified_cleaned_data):
     [Input('intermediate_value_main', 'children'),
      Input('dt-picker-range', 'start_date'),
      Input('dt-picker-range', 'end_date')])
-def clean_date_data(jsonified_cleaned_data, start_date, end_date):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    temp = df.loc[(df['date'] > start_date)
-                  & (df['date'] < end_date)].copy()
-    return temp.to_json(date_format='iso', orient='split')
+@metrics.instrumented
+def clean_date_data(data_key, start_date, end_date):
+    # Dates are cut to the day so that every page load and user picking the
+    # same range shares one view key, and with it the memoized builders.
+    return datastore.view(data_key, 'date', day(start_date), day(end_date))
 
 
 @ app.callback(
@@ -935,10 +832,9 @@ def clean_date_data(jsonified_cleaned_data, start_date, end_date):
     [Input('intermediate_value_main', 'children'),
      Input('quarter_dropdown', 'value')]
 )
-def clean_quarter_data(jsonified_cleaned_data, quarter):
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    df = df.loc[df['year_quarter'] == quarter]
-    return df.to_json(date_format='iso', orient='split')
+@metrics.instrumented
+def clean_quarter_data(data_key, quarter):
+    return datastore.view(data_key, 'quarter', quarter)
 
 
 if __name__ == '__main__':
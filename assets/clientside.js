@@ -0,0 +1,73 @@
+// Clientside callbacks filling in the dropdown options and KPI labels from
+// the date_summary store (see rollup.summary), and resetting the activity
+// table's page, without a server request.
+
+(function () {
+    function options(first, names) {
+        return [{label: first, value: first}].concat(
+            (names || []).map(function (name) {
+                return {label: name, value: name};
+            }));
+    }
+
+    function picked(names, codes, values, everything) {
+        // Which pairs a dropdown keeps, as rollup.filter_cube decides it.
+        if (values && values.length === 1 && values[0] === everything) {
+            return codes.map(function () { return true; });
+        }
+        return codes.map(function (code) {
+            return code >= 0 && (values || []).indexOf(names[code]) >= 0;
+        });
+    }
+
+    function totals(summary, keep) {
+        if (!summary) {
+            return ['', '', ''];
+        }
+        var pairs = summary.pairs;
+        return ['bob', 'rows', 'staff'].map(function (measure) {
+            var total = 0;
+            pairs[measure].forEach(function (value, i) {
+                if (!keep || keep[i]) {
+                    total += value;
+                }
+            });
+            return String(total);
+        });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        summary: {
+            bd_options: function (summary) {
+                return options('All BDs', summary && summary.brand_developer);
+            },
+            discipline_options: function (summary) {
+                return options('All', summary && summary.discipline);
+            },
+            quarter_options: function (summary) {
+                return options('2020 Q3', summary && summary.year_quarter);
+            },
+            totals: function (summary) {
+                return totals(summary);
+            },
+            filtered_totals: function (summary, BD, ride_type) {
+                if (!summary) {
+                    return totals(summary);
+                }
+                var pairs = summary.pairs;
+                var bds = picked(summary.brand_developer, pairs.brand_developer,
+                                 BD, 'All BDs');
+                var disciplines = picked(summary.discipline, pairs.discipline,
+                                         ride_type, 'All');
+                return totals(summary, bds.map(function (keep, i) {
+                    return keep && disciplines[i];
+                }));
+            }
+        },
+        table: {
+            first_page: function () {
+                return 0;
+            }
+        }
+    });
+})();
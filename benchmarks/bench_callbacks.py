@@ -0,0 +1,189 @@
+"""
+Times every callback of app.py on synthetic data of several sizes and
+saves or compares JSON baselines.
+
+    python benchmarks/bench_callbacks.py --save benchmarks/baseline.json
+    python benchmarks/bench_callbacks.py --compare benchmarks/baseline.json
+
+Callbacks are called directly with their caches bypassed, on data from
+the synthetic source. For each one the best wall time of --repeat runs,
+the peak memory traced during a separate run and the size of the JSON
+Dash would send are recorded. --compare exits with status 1 if any of
+them grew by more than --threshold.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py pulls and serves data as soon as it is imported.
+os.environ.update({'DATA_SOURCE': 'synthetic', 'SYNTHETIC_ROWS': '1000',
+                   'REFRESH_INTERVAL': '0', 'FULL_SYNC_EVERY': '1',
+                   'CACHE_BACKEND': 'memory',
+                   'SNAPSHOT_PATH': os.path.join(tempfile.mkdtemp(),
+                                                 'snapshot.feather')})
+os.environ.setdefault('VALID_USERNAME_PASSWORD_PAIRS', 'benchmark')
+
+import pandas as pd  # noqa: E402
+import plotly  # noqa: E402
+from plotly.utils import PlotlyJSONEncoder  # noqa: E402
+
+import app  # noqa: E402
+import datastore  # noqa: E402
+import rollup  # noqa: E402
+import sources  # noqa: E402
+import synthetic  # noqa: E402
+
+# Wall time changes smaller than this are never reported as regressions.
+MIN_SECONDS = .002
+
+
+def payload_bytes(value):
+    """ Returns the size of value as JSON, as Dash would send it. """
+    return len(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+def cases(main_key):
+    """
+    Returns (name, function) pairs calling each callback the way the page
+    does on first load: the last 90 days, every BD and discipline, the
+    latest quarter and the first bonus table row selected.
+    """
+    raw = {name: inspect.unwrap(getattr(app, name)) for name in [
+        'clean_date_data', 'clean_quarter_data', 'date_summary',
+        'build_main_map', 'build_second_map', 'build_bonus_table',
+        'build_bar', 'build_main_table']}
+    end = datetime.now()
+    date_key = raw['clean_date_data'](main_key, str(end - timedelta(days=90)),
+                                      str(end))
+    quarter = rollup.summary(main_key)['year_quarter'][-1]
+    quarter_key = raw['clean_quarter_data'](main_key, quarter)
+    table = raw['build_bonus_table'](quarter_key)
+
+    def pull():
+        # Forget the frames and cube so the pull rebuilds them all.
+        datastore._frames.clear()
+        return app.clean_main_data()
+
+    def view(key):
+        # Drop the cached slice so the callback's view is built again.
+        datastore._frames.pop(key, None)
+        datastore.get(key)
+        return key
+
+    return [
+        ('clean_main_data', pull),
+        ('clean_date_data', lambda: view(raw['clean_date_data'](
+            main_key, str(end - timedelta(days=90)), str(end)))),
+        ('clean_quarter_data', lambda: view(raw['clean_quarter_data'](
+            main_key, quarter))),
+        ('date_summary', lambda: raw['date_summary'](date_key)),
+        ('build_main_map', lambda: raw['build_main_map'](date_key)),
+        ('build_second_map', lambda: raw['build_second_map'](
+            date_key, ['All BDs'], ['All'])),
+        ('build_bonus_table', lambda: raw['build_bonus_table'](quarter_key)),
+        ('build_bar', lambda: raw['build_bar'](quarter_key, table, [0],
+                                               table[:1])),
+        ('build_main_table', lambda: raw['build_main_table'](
+            date_key, 0, app.MAIN_TABLE_PAGE_SIZE, [], '')),
+    ]
+
+
+def measure(func, repeat):
+    """ Returns the best seconds, peak traced bytes and payload bytes. """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        seconds.append(time.perf_counter() - start)
+    # Traced separately, tracemalloc slows allocation-heavy code a lot.
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_bytes': peak,
+            'payload_bytes': payload_bytes(value)}
+
+
+def run(sizes, repeat):
+    """ Returns {rows: {callback: measurements}} for each size. """
+    for thread in threading.enumerate():
+        if thread.name == 'sheet-refresher':
+            thread.join()
+    results = {}
+    for rows in sizes:
+        sources._source = sources.LocalSource(synthetic.values(rows))
+        main_key = app.clean_main_data()
+        results[str(rows)] = {}
+        for name, func in cases(main_key):
+            results[str(rows)][name] = measure(func, repeat)
+            m = results[str(rows)][name]
+            print(f'{rows:>8} {name:>19} {m["seconds"] * 1000:10.1f} '
+                  f'{m["peak_bytes"] / 1e6:9.1f} {m["payload_bytes"] / 1e3:10.1f}')
+    return results
+
+
+def compare(baseline, results, threshold):
+    """
+    Prints and returns the measurements that grew by more than threshold
+    (e.g. .2 for 20%) since baseline.
+    """
+    regressions = []
+    for rows, callbacks in results.items():
+        for name, current in callbacks.items():
+            before = baseline['results'].get(rows, {}).get(name)
+            if before is None:
+                continue
+            for metric, value in current.items():
+                old = before[metric]
+                if value <= old * (1 + threshold):
+                    continue
+                if metric == 'seconds' and value - old < MIN_SECONDS:
+                    continue
+                regressions.append((rows, name, metric, old, value))
+                change = f' ({value / old - 1:+.0%})' if old else ''
+                print(f'REGRESSION {rows} rows {name} {metric}: '
+                      f'{old:.4g} -> {value:.4g}{change}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=.2)
+    args = parser.parse_args()
+
+    print(f'{"rows":>8} {"callback":>19} {"ms":>10} {"peak MB":>9} '
+          f'{"payload kB":>10}')
+    results = run(args.rows, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'meta': {'created': datetime.now().isoformat(),
+                                'python': platform.python_version(),
+                                'pandas': pd.__version__,
+                                'plotly': plotly.__version__,
+                                'machine': platform.platform()},
+                       'results': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+        print('No regressions.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares the old chained-replace cleaning of the form sheet with the
+schema-driven schema.clean_rows.
+
+    python benchmarks/bench_clean.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema  # noqa: E402
+from synthetic import raw_frame  # noqa: E402
+
+
+def legacy_clean(df):
+    """ The cleaning steps clean_main_data ran before the schema stage. """
+    df.columns = [name for name, _ in schema.COLUMNS]
+    df['date'] = pd.to_datetime(df.date)
+    df['Week'] = df['date'].dt.isocalendar().week
+    df['quarter'] = df['date'].dt.quarter.astype(str)
+    df['year'] = df['date'].dt.year.astype(str)
+    df['year_quarter'] = df['year'] + " Q" + df['quarter']
+    integers = [name for name, dtype in schema.COLUMNS if dtype == 'int32']
+    df[integers] = df[integers].replace(
+        '', 0).replace('None', 0).astype(int)
+    df = df.replace('', np.nan).replace('None', np.nan)
+    return df
+
+
+def measure(clean, raw):
+    """ Returns seconds, peak traced bytes and cleaned frame bytes. """
+    start = time.perf_counter()
+    df = clean(raw.copy())
+    seconds = time.perf_counter() - start
+    # Timed separately, tracemalloc slows allocation-heavy code a lot.
+    copy = raw.copy()
+    tracemalloc.start()
+    clean(copy)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, df.memory_usage(deep=True).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    raw = raw_frame(args.rows)
+    print(f'{args.rows} rows')
+    print(f'{"":>8} {"seconds":>9} {"peak MB":>9} {"frame MB":>9}')
+    results = {}
+    for name, clean in [('legacy', legacy_clean), ('schema', schema.clean_rows)]:
+        results[name] = measure(clean, raw)
+        seconds, peak, size = results[name]
+        print(f'{name:>8} {seconds:9.3f} {peak / 1e6:9.1f} {size / 1e6:9.1f}')
+    speedup = results['legacy'][0] / results['schema'][0]
+    shrink = results['legacy'][2] / results['schema'][2]
+    print(f'{speedup:.1f}x faster, frame {shrink:.1f}x smaller')
+
+
+if __name__ == '__main__':
+    main()
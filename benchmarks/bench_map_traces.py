@@ -0,0 +1,86 @@
+"""
+Compares building the map traces with a boolean mask per trace property
+against figures.main_map / figures.discipline_map, which partition the
+rows once. Binning is turned off so both draw a marker per event.
+
+    python benchmarks/bench_map_traces.py --rows 10000 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import figures  # noqa: E402
+import schema  # noqa: E402
+from synthetic import raw_frame  # noqa: E402
+
+
+def legacy_main_map(df, scale=.07):
+    """ The main map as built before, re-evaluating df[key] > 0 per property. """
+    traces = []
+    for key, name in figures.MAIN_MAP_TRACES:
+        traces.append(figures.geo_trace(
+            name,
+            lon=df.loc[df[key] > 0, 'longitude'],
+            lat=df.loc[df[key] > 0, 'latitude'],
+            text=df.loc[df[key] > 0, 'brand_developer'],
+            customdata=df[key].loc[df[key] > 0],
+            hovertemplate=figures.AUDIENCE_HOVER,
+            size=(df[key].loc[df[key] > 0] / scale).values))
+    traces.append(figures.geo_trace(
+        "Shop Assist",
+        lon=df.loc[~df['shop_assist_retailer'].isnull(), 'longitude'],
+        lat=df.loc[~df['shop_assist_retailer'].isnull(), 'latitude'],
+        text=df.loc[~df['shop_assist_retailer'].isnull(), 'brand_developer'],
+        customdata=df['shop_assist_retailer'].loc[
+            ~df['shop_assist_retailer'].isnull()],
+        hovertemplate=figures.SHOP_HOVER, symbol='star-diamond', size=10))
+    return figures.map_figure(traces)
+
+
+def legacy_discipline_map(df, disciplines, scale=.1):
+    """ The discipline map as built before, comparing per property. """
+    df = df.copy()
+    df['agg'] = df[figures.AUDIENCE_COLUMNS].sum(axis=1)
+    traces = []
+    for i in disciplines:
+        traces.append(figures.geo_trace(
+            i,
+            lon=df.loc[df['discipline'] == i, 'longitude'],
+            lat=df.loc[df['discipline'] == i, 'latitude'],
+            text=df.loc[df['discipline'] == i, 'brand_developer'],
+            customdata=df['agg'].loc[df['discipline'] == i],
+            hovertemplate=figures.AUDIENCE_HOVER,
+            size=(df['agg'].loc[df['discipline'] == i] / scale).values))
+    return figures.map_figure(traces)
+
+
+def best_of(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f'{"rows":>8} {"map":>11} {"legacy ms":>10} {"ms":>8} {"speedup":>8}')
+    for rows in args.rows:
+        df = schema.clean_rows(raw_frame(rows))
+        disciplines = list(df['discipline'].unique())
+        cases = [
+            ('main', lambda: legacy_main_map(df),
+             lambda: figures.main_map(df, binned=False)),
+            ('discipline', lambda: legacy_discipline_map(df, disciplines),
+             lambda: figures.discipline_map(df, disciplines, binned=False)),
+        ]
+        for name, legacy, current in cases:
+            before, after = best_of(legacy), best_of(current)
+            print(f'{rows:>8} {name:>11} {before * 1000:10.1f} '
+                  f'{after * 1000:8.1f} {before / after:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
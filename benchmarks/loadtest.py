@@ -0,0 +1,299 @@
+"""
+Replays dashboard sessions against the server over HTTP and reports
+latency percentiles and throughput per callback.
+
+    python benchmarks/loadtest.py --url http://localhost:8000 --users 5 20
+    python benchmarks/loadtest.py --gunicorn 1x8 2x4 4x2 --users 10 30
+
+Each simulated user loads the page, then repeatedly picks a date range,
+some BDs and disciplines, a quarter and a bonus table row, sending the
+same /_dash-update-component requests the browser would. With --gunicorn
+a `gunicorn app:server` with each WORKERSxTHREADS configuration is
+started on the synthetic data source, loaded and stopped in turn.
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Props the DataTable sets in the browser whenever another prop changes.
+BROWSER_PROPS = {'bonus_table.data': ['bonus_table.derived_virtual_data']}
+
+
+def _props(component, props):
+    # Collects 'id.prop' -> value for every component with an id.
+    if isinstance(component, list):
+        for child in component:
+            _props(child, props)
+        return
+    if not isinstance(component, dict) or 'props' not in component:
+        return
+    own = component['props']
+    if 'id' in own:
+        for name, value in own.items():
+            if name not in ('id', 'children') or not isinstance(
+                    value, (dict, list)):
+                props[f'{own["id"]}.{name}'] = value
+    _props(own.get('children'), props)
+
+
+def _outputs(output):
+    # '..a.x...b.y..' -> ['a.x', 'b.y']; 'a.x' -> ['a.x']
+    if output.startswith('..'):
+        return output[2:-2].split('...')
+    return [output]
+
+
+class Session:
+    """ One browser tab: the page's props and the callbacks they drive. """
+
+    def __init__(self, url, auth, dependencies, records):
+        self.url = url.rstrip('/')
+        self.http = requests.Session()
+        self.http.auth = auth
+        self.records = records
+        self.state = {}
+        # Clientside callbacks run in the browser, not against the server.
+        self.callbacks = [d for d in dependencies
+                          if not d.get('clientside_function')]
+        self.order = self._sorted(self.callbacks)
+
+    @staticmethod
+    def _sorted(callbacks):
+        # Callbacks in an order where each comes after those feeding it.
+        done, order = set(), []
+        while len(order) < len(callbacks):
+            for c in callbacks:
+                if c['output'] in done:
+                    continue
+                needs = {f'{i["id"]}.{i["property"]}' for i in c['inputs']}
+                if not any(needs & set(_outputs(o['output']))
+                           for o in callbacks
+                           if o['output'] not in done and o is not c):
+                    done.add(c['output'])
+                    order.append(c)
+                    break
+            else:
+                order += [c for c in callbacks if c['output'] not in done]
+        return order
+
+    def load(self):
+        """ Loads the layout and runs every callback, as on page load. """
+        start = time.perf_counter()
+        response = self.http.get(self.url + '/_dash-layout')
+        self.records.append(('_dash-layout', time.perf_counter() - start,
+                             len(response.content), response.status_code))
+        response.raise_for_status()
+        _props(response.json(), self.state)
+        self.fire(None)
+
+    def set(self, **props):
+        """ Sets props like the user would, e.g. set(**{'x.value': 1}). """
+        self.state.update(props)
+        self.fire(set(props))
+
+    def fire(self, changed):
+        """
+        Calls the callbacks whose inputs are in changed, then those whose
+        inputs they changed in turn. None makes every callback's initial
+        call.
+        """
+        for callback in self.order:
+            inputs = [f'{i["id"]}.{i["property"]}' for i in callback['inputs']]
+            # The initial call of a callback names no changed prop.
+            triggered = [] if changed is None else [
+                i for i in inputs if i in changed]
+            if changed is not None and not triggered:
+                continue
+            updated = self._call(callback, inputs, triggered)
+            if changed is not None:
+                changed |= updated
+
+    def _call(self, callback, inputs, triggered):
+        def values(ids):
+            return [dict(zip(['id', 'property'], i.rsplit('.', 1)),
+                         value=self.state.get(i)) for i in ids]
+        states = [f'{s["id"]}.{s["property"]}' for s in callback['state']]
+        body = {'output': callback['output'], 'inputs': values(inputs),
+                'state': values(states), 'changedPropIds': triggered}
+        start = time.perf_counter()
+        response = self.http.post(self.url + '/_dash-update-component',
+                                  json=body)
+        seconds = time.perf_counter() - start
+        outputs = _outputs(callback['output'])
+        label = outputs[0] + (f' +{len(outputs) - 1}' if len(outputs) > 1
+                              else '')
+        self.records.append((label, seconds, len(response.content),
+                             response.status_code))
+        if response.status_code != 200:
+            return set()
+        updated = set()
+        for component, props in response.json()['response'].items():
+            for name, value in props.items():
+                prop = f'{component}.{name}'
+                self.state[prop] = value
+                updated.add(prop)
+                for derived in BROWSER_PROPS.get(prop, []):
+                    self.state[derived] = value
+                    updated.add(derived)
+        return updated
+
+
+def play(session, rng, rounds):
+    """ Loads the page and goes through rounds of typical interactions. """
+    session.load()
+    for _ in range(rounds):
+        end = datetime.now() - timedelta(days=rng.randrange(365))
+        session.set(**{
+            'dt-picker-range.start_date':
+                (end - timedelta(days=rng.choice([30, 90, 180, 365]))).isoformat(),
+            'dt-picker-range.end_date': end.isoformat()})
+        summary = session.state.get('date_summary.data') or {}
+        bds = summary.get('brand_developer') or []
+        if bds:
+            session.set(**{'BD Dropdown.value':
+                           rng.sample(bds, rng.randint(1, min(3, len(bds))))})
+        disciplines = summary.get('discipline') or []
+        if disciplines:
+            session.set(**{'Ride Type Dropdown.value':
+                           [rng.choice(disciplines)]})
+        session.set(**{'BD Dropdown.value': ['All BDs'],
+                       'Ride Type Dropdown.value': ['All']})
+        quarters = summary.get('year_quarter') or []
+        if quarters:
+            session.set(**{'quarter_dropdown.value': rng.choice(quarters)})
+        rows = session.state.get('bonus_table.data') or []
+        if rows:
+            picked = [rng.randrange(len(rows))]
+            session.set(**{'bonus_table.selected_rows': picked,
+                           'bonus_table.derived_virtual_selected_rows': picked})
+
+
+def load(url, auth, users, sessions, rounds, seed=0):
+    """
+    Runs sessions for each of users concurrent users.
+    Output: list of (callback, seconds, bytes, status) and the wall time
+    """
+    dependencies = requests.get(url.rstrip('/') + '/_dash-dependencies',
+                                auth=auth).json()
+    records = []
+    lock = threading.Lock()
+
+    def user(n):
+        rng = random.Random(seed + n)
+        mine = []
+        for _ in range(sessions):
+            play(Session(url, auth, dependencies, mine), rng, rounds)
+        with lock:
+            records.extend(mine)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        list(pool.map(user, range(users)))
+    return records, time.perf_counter() - start
+
+
+def report(records, seconds, title):
+    """ Prints latency percentiles and throughput per callback. """
+    print(f'\n{title}: {len(records)} requests in {seconds:.1f}s, '
+          f'{len(records) / seconds:.1f} req/s')
+    print(f'{"callback":>36} {"n":>6} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"req/s":>7} {"kB":>8} {"errors":>6}')
+    labels = sorted({r[0] for r in records})
+    for label in labels:
+        mine = [r for r in records if r[0] == label]
+        ms = np.array([r[1] for r in mine]) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        errors = sum(1 for r in mine if r[3] >= 400)
+        size = np.mean([r[2] for r in mine]) / 1000
+        print(f'{label[-36:]:>36} {len(mine):>6} {p50:8.1f} {p95:8.1f} '
+              f'{p99:8.1f} {len(mine) / seconds:7.1f} {size:8.1f} {errors:>6}')
+
+
+def start_gunicorn(workers, threads, port, rows, password):
+    """
+    Starts gunicorn on synthetic data and waits until it serves. Its cache,
+    snapshot and metrics go to a new temporary directory, so they don't
+    mix with those of a dashboard running on the same host.
+    """
+    scratch = tempfile.mkdtemp(prefix='loadtest-')
+    env = dict(os.environ, DATA_SOURCE='synthetic', SYNTHETIC_ROWS=str(rows),
+               VALID_USERNAME_PASSWORD_PAIRS=password, REFRESH_INTERVAL='0',
+               CACHE_DIR=os.path.join(scratch, 'cache'),
+               SNAPSHOT_PATH=os.path.join(scratch, 'snapshot.feather'),
+               METRICS_DIR=os.path.join(scratch, 'metrics'))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:server', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads),
+         '--timeout', '300'], cwd=ROOT, env=env)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(600):
+        try:
+            if requests.get(url + '/_dash-layout',
+                            auth=('demo', password)).ok:
+                return server, url, scratch
+        except requests.ConnectionError:
+            pass
+        if server.poll() is not None:
+            shutil.rmtree(scratch)
+            sys.exit('gunicorn exited')
+        time.sleep(.5)
+    server.terminate()
+    server.wait()
+    shutil.rmtree(scratch)
+    sys.exit('gunicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--gunicorn', nargs='+', metavar='WORKERSxTHREADS',
+                        help='start gunicorn with each configuration instead '
+                             'of using --url')
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='synthetic rows served by --gunicorn')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--users', type=int, nargs='+', default=[10])
+    parser.add_argument('--sessions', type=int, default=2,
+                        help='sessions per user')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='rounds of interactions per session')
+    parser.add_argument('--password', default=os.environ.get(
+        'VALID_USERNAME_PASSWORD_PAIRS', 'loadtest'))
+    args = parser.parse_args()
+    auth = ('demo', args.password)
+
+    configs = args.gunicorn or [None]
+    for config in configs:
+        server, url, scratch = None, args.url, None
+        if config:
+            workers, threads = config.split('x')
+            server, url, scratch = start_gunicorn(workers, threads, args.port,
+                                         args.rows, args.password)
+        try:
+            for users in args.users:
+                records, seconds = load(url, auth, users, args.sessions,
+                                        args.rounds)
+                report(records, seconds,
+                       f'{config or url}, {users} users')
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+                shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import contextlib
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+# Number of callback results kept, and seconds before an entry expires.
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 256))
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 3600))
+
+# Where results and snapshots are shared between gunicorn workers:
+# 'memory' (not shared), 'filesystem' (CACHE_DIR) or 'redis' (REDIS_URL).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(),
+                                                     'google_dashboard'))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+class MemoryBackend:
+    """ Per-process backend, used when nothing is shared. """
+
+    shared = False
+
+    def __init__(self):
+        self._values = {}
+        self._locks = {}
+
+    def get(self, key):
+        hit = self._values.get(key)
+        if hit is not None and (hit[0] is None or hit[0] > time.time()):
+            return hit[1]
+        return None
+
+    def set(self, key, value, ttl=None):
+        self._values[key] = (time.time() + ttl if ttl else None, value)
+
+    def delete(self, key):
+        self._values.pop(key, None)
+
+    def lock(self, name):
+        return self._locks.setdefault(name, threading.Lock())
+
+
+class FileSystemBackend:
+    """
+    Stores pickled values as files in a directory every worker can see.
+    Locks are flock()s on a file per lock name.
+    """
+
+    shared = True
+    PRUNE_EVERY = 200
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def prune(self):
+        """ Deletes expired entries. """
+        for name in os.listdir(self.directory):
+            if '.' in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as f:
+                    expires, _ = pickle.load(f)
+                if expires is not None and expires < time.time():
+                    os.remove(path)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        import fcntl
+        with open(os.path.join(self.directory, name + '.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RedisBackend:
+    """ Stores pickled values in Redis. Requires the redis package. """
+
+    shared = True
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                        ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def lock(self, name):
+        return self.client.lock('lock:' + name, timeout=600)
+
+
+def get_backend(name=CACHE_BACKEND):
+    """
+    Returns the backend configured by CACHE_BACKEND.
+    """
+    if name == 'filesystem':
+        return FileSystemBackend(CACHE_DIR)
+    if name == 'redis':
+        return RedisBackend(REDIS_URL)
+    if name != 'memory':
+        raise ValueError(f'Unknown CACHE_BACKEND {name!r}')
+    return MemoryBackend()
+
+
+backend = get_backend()
+
+
+def lock(name):
+    """
+    Returns a lock held by at most one thread in one worker at a time.
+    """
+    return backend.lock(name)
+
+
+def normalize(value):
+    """
+    Returns a hashable version of a callback input.
+
+    Lists become tuples and dicts become sorted tuples of items, so equal
+    dropdown values and table selections produce equal cache keys.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+    return value
+
+
+def _plain(value):
+    # Store figures as the dicts Dash would serialize, so a hit skips plotly.
+    if hasattr(value, 'to_plotly_json'):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return tuple(_plain(v) for v in value)
+    return value
+
+
+def memoize(func):
+    """
+    Caches a callback's output on its normalized inputs.
+
+    The data inputs are datastore keys, which change whenever the snapshot
+    does, so the key already carries the data version. Entries are evicted
+    least recently used first and expire after CACHE_TTL seconds.
+    Figures are cached as plain dicts. With a shared backend, results one
+    worker has computed are reused by the others.
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__name__, normalize(args))
+        now = time.time()
+        with _lock:
+            hit = _results.get(key)
+            if hit is not None and now - hit[0] < CACHE_TTL:
+                _results.move_to_end(key)
+                metrics.cache_result('hit')
+                return hit[1]
+        value = None
+        if backend.shared:
+            shared_key = 'memo:' + hashlib.sha1(repr(key).encode()).hexdigest()
+            value = backend.get(shared_key)
+        if value is None:
+            metrics.cache_result('miss')
+            value = _plain(func(*args))
+            if backend.shared:
+                backend.set(shared_key, value, CACHE_TTL)
+        else:
+            metrics.cache_result('shared')
+        with _lock:
+            _results[key] = (now, value)
+            _results.move_to_end(key)
+            while len(_results) > CACHE_SIZE:
+                _results.popitem(last=False)
+        return value
+    return wrapper
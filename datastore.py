@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import cache
+
+# Number of frames kept in memory before the least recently used is dropped.
+MAX_FRAMES = 32
+# Seconds a snapshot is kept in a shared cache backend. A snapshot is
+# deleted as soon as a newer one replaces it; this only bounds leftovers.
+SNAPSHOT_TTL = 7 * 24 * 3600
+# Feather file the latest snapshot is saved to for fast startup; '' disables.
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH',
+                               os.path.join(cache.CACHE_DIR, 'snapshot.feather'))
+
+_frames = OrderedDict()
+_views = {}
+_latest = None
+_info = {}
+# Key of the snapshot this process last saved to or loaded from SNAPSHOT_PATH.
+_saved = None
+# Guards the state above; callbacks run on several threads per worker.
+_lock = threading.RLock()
+
+
+def frame_key(df):
+    """
+    Returns a short content hash for a DataFrame.
+
+    Input: Pandas DataFrame
+    Output: hex digest string, identical for frames with identical contents
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _remember(key, df):
+    with _lock:
+        _frames[key] = df
+        _frames.move_to_end(key)
+        for old in list(_frames):
+            if len(_frames) <= MAX_FRAMES:
+                break
+            if old != _latest:
+                del _frames[old]
+
+
+def _forget(key):
+    # Drops a snapshot and every view and derived frame built from it.
+    with _lock:
+        for old in list(_frames):
+            if old == key or old.startswith((key + '|', key + '#')):
+                del _frames[old]
+
+
+def _recall(key):
+    # The frame stored under key, or None, marking it as recently used.
+    with _lock:
+        df = _frames.get(key)
+        if df is not None:
+            _frames.move_to_end(key)
+        return df
+
+
+def _replace_latest(key, df):
+    # Makes key this process's latest snapshot. The one it replaces is
+    # dropped with its views and derived frames; keys still naming it get
+    # the latest snapshot from get().
+    global _latest
+    with _lock:
+        if _latest is not None and _latest != key:
+            _forget(_latest)
+        _latest = key
+        _remember(key, df)
+
+
+def put(df, **info):
+    """
+    Stores a cleaned DataFrame and marks it as the latest snapshot.
+    With a shared cache backend the frame is visible to every worker, and
+    the snapshot it replaces is deleted there; keys still pointing at it
+    fall back to the latest snapshot in get().
+
+    Input: Pandas DataFrame, plus any keyword details to keep with it
+           ('at' overrides the time the data was pulled)
+    Output: key to pass through the hidden layout components
+    """
+    key = frame_key(df)
+    info = dict({'at': time.time()}, **info, key=key)
+    with _lock:
+        _replace_latest(key, df)
+        if not cache.backend.shared:
+            _info.update(info)
+    if cache.backend.shared:
+        previous = cache.backend.get('latest')
+        # A refresh without new rows only moves the time of the pull on,
+        # until the stored frame is half way to expiring.
+        if (previous and previous['key'] == key
+                and time.time() - previous.get('stored', 0) < SNAPSHOT_TTL / 2):
+            info['stored'] = previous['stored']
+        else:
+            info['stored'] = time.time()
+            cache.backend.set('frame:' + key, df, SNAPSHOT_TTL)
+        cache.backend.set('latest', info)
+        if previous and previous['key'] != key:
+            cache.backend.delete('frame:' + previous['key'])
+    return key
+
+
+def latest_info():
+    """
+    Returns the latest snapshot's key, the time it was stored ('at') and the
+    details passed to put(), or None if nothing has been stored yet.
+    """
+    if cache.backend.shared:
+        return cache.backend.get('latest')
+    with _lock:
+        return dict(_info) if _info else None
+
+
+def latest():
+    """ Returns the key of the most recently stored snapshot. """
+    info = latest_info()
+    return info['key'] if info else _latest
+
+
+def register_view(name, func):
+    """
+    Registers a named derivation of a stored frame.
+
+    func(df, *args) must return a DataFrame and must not modify df.
+    """
+    _views[name] = func
+
+
+def view(key, name, *args):
+    """
+    Returns the key of a frame derived from the frame stored under key.
+
+    The key spells out its parent and arguments so that any process holding
+    the parent frame can rebuild it on demand.
+    """
+    return '|'.join([key, name, json.dumps(args, default=str)])
+
+
+def get(key):
+    """
+    Returns the DataFrame stored under key.
+
+    Derived frames are rebuilt from their parent if they have been evicted,
+    and snapshots another worker stored are loaded from the shared backend.
+    A snapshot key this process has never seen (e.g. one issued before the
+    sheet was re-pulled) falls back to the latest snapshot.
+    Callers share the returned frame and must not modify it in place.
+    """
+    df = _recall(key)
+    if df is not None:
+        return df
+    if '|' in key:
+        parent, name, args = key.rsplit('|', 2)
+        df = _views[name](get(parent), *json.loads(args))
+        _remember(key, df)
+        return df
+    df = cache.backend.get('frame:' + key) if cache.backend.shared else None
+    if df is not None:
+        if key == latest():
+            # Another worker's refresh; this one's snapshot is now stale.
+            _replace_latest(key, df)
+        else:
+            _remember(key, df)
+        return df
+    latest_key = latest()
+    if latest_key is None or latest_key == key:
+        raise KeyError(key)
+    print(f'Unknown data key {key}, using latest snapshot.')
+    return get(latest_key)
+
+
+def derived(key, name, build):
+    """
+    Returns build(frame) for the frame stored under key, computed once.
+
+    For a view key the view is applied to the parent's result instead, so
+    build only ever runs on whole snapshots. Its result must keep the
+    columns the views slice on (e.g. 'date').
+    """
+    derived_key = key + '#' + name
+    result = _recall(derived_key)
+    if result is not None:
+        return result
+    if '|' in key:
+        parent, view, args = key.rsplit('|', 2)
+        result = _views[view](derived(parent, name, build), *json.loads(args))
+    else:
+        result = build(get(key))
+    _remember(derived_key, result)
+    return result
+
+
+def save_snapshot(schema_version, source, path=SNAPSHOT_PATH):
+    """
+    Writes the latest snapshot to a Feather file with its put() details,
+    unless this process already saved or loaded that snapshot.
+
+    Input: version of the cleaned frame's schema and the source the data
+           was read from, both checked on load
+    """
+    global _saved
+    if not path:
+        return
+    try:
+        import pyarrow as pa
+        from pyarrow import feather
+    except ImportError:
+        print('pyarrow is not installed, not saving a snapshot.')
+        return
+    info = latest_info()
+    if info['key'] == _saved:
+        return
+    table = pa.Table.from_pandas(get(info['key']), preserve_index=False)
+    meta = json.dumps({'schema_version': schema_version, 'source': source,
+                       'info': info})
+    table = table.replace_schema_metadata(
+        dict(table.schema.metadata or {}, dashboard=meta))
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # Every worker saves its own snapshots, so each writes its own file.
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    _saved = info['key']
+
+
+def load_snapshot(schema_version, source, path=SNAPSHOT_PATH):
+    """
+    Memory-maps a snapshot written by save_snapshot() and stores it as the
+    latest snapshot, keeping the time it was originally pulled.
+
+    Input: schema version the running code expects and the source it reads
+    Output: key of the loaded snapshot, or None if there is no usable file
+    """
+    global _saved
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+        meta = json.loads(table.schema.metadata[b'dashboard'])
+    except Exception as e:
+        print(f'Could not read snapshot {path}: {e}')
+        return None
+    if meta['schema_version'] != schema_version:
+        print(f'Ignoring snapshot {path} with schema version '
+              f'{meta["schema_version"]}, expected {schema_version}.')
+        return None
+    if meta.get('source') != source:
+        print(f'Ignoring snapshot {path} of {meta.get("source")}, '
+              f'expected {source}.')
+        return None
+    info = meta['info']
+    info.pop('key')
+    _saved = put(table.to_pandas(), **info)
+    return _saved
@@ -0,0 +1,113 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# DataTable filter operators, as written in filter_query and as typed by
+# the user, longest first so '>=' is matched before '>'.
+OPERATORS = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+
+# A clause is '{column}' followed by an operator and its value.
+_CLAUSE = re.compile(r'\s*\{(?P<name>[^}]*)\}\s*(?P<rest>.*)', re.DOTALL)
+
+_COMPARISONS = {'eq': np.equal, 'ne': np.not_equal, 'lt': np.less,
+                'le': np.less_equal, 'gt': np.greater, 'ge': np.greater_equal}
+
+
+def split_filter_part(filter_part):
+    """
+    Splits one clause of a DataTable filter_query, e.g. '{demo_bob} ge 10'.
+
+    Output: (column, operator, value) with operator one of 'eq', 'ne',
+            'lt', 'le', 'gt', 'ge', 'contains', 'datestartswith', or
+            (None, None, None) if the clause can't be read
+    """
+    clause = _CLAUSE.fullmatch(filter_part)
+    if not clause:
+        return None, None, None
+    # Only the operator right after the column counts; the value may hold
+    # operator words too, as in '{event_name} contains "Sale day"'.
+    rest = clause['rest']
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if rest.startswith(operator):
+                value_part = rest[len(operator):].strip()
+                if not value_part:
+                    return None, None, None
+                quote = value_part[0]
+                if quote == value_part[-1] and quote in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + quote, quote)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return clause['name'], operator_type[0].strip(), value
+    return None, None, None
+
+
+def _as_text(value):
+    # 80301.0 typed into a zip code filter means '80301'.
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def filter_frame(df, filter_query):
+    """
+    Returns the rows of df matching a DataTable filter_query.
+    Every clause is a vectorized comparison on one column; clauses naming
+    unknown columns are ignored.
+    """
+    if not filter_query:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for part in filter_query.split(' && '):
+        name, operator, value = split_filter_part(part)
+        if name not in df.columns:
+            continue
+        col = df[name]
+        if operator == 'contains':
+            matched = col.astype(str).str.contains(_as_text(value),
+                                                   case=False, regex=False)
+        elif operator == 'datestartswith':
+            matched = col.astype(str).str.startswith(_as_text(value))
+        elif pd.api.types.is_numeric_dtype(col) and isinstance(value, float):
+            matched = _COMPARISONS[operator](col, value)
+        elif pd.api.types.is_datetime64_any_dtype(col):
+            try:
+                matched = _COMPARISONS[operator](col, pd.Timestamp(value))
+            except ValueError:
+                continue
+        else:
+            matched = _COMPARISONS[operator](col.astype(str), _as_text(value))
+        mask &= np.asarray(matched, dtype=bool)
+    return df.loc[mask]
+
+
+def sort_frame(df, sort_by):
+    """ Returns df sorted by a DataTable sort_by list. """
+    sort_by = [s for s in sort_by or [] if s['column_id'] in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values([s['column_id'] for s in sort_by],
+                          ascending=[s['direction'] == 'asc' for s in sort_by],
+                          kind='mergesort')
+
+
+def page_count(df, page_size):
+    """ Returns the number of pages of df, at least 1. """
+    return max(1, -(-len(df) // page_size))
+
+
+def page(df, page_current, page_size):
+    """ Returns the rows of df on page page_current (counting from 0). """
+    start = (page_current or 0) * page_size
+    return df.iloc[start: start + page_size]
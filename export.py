@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+
+# Rows converted and sent per chunk of a streamed export.
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 10000))
+
+FORMATS = {'csv': 'text/csv',
+           'parquet': 'application/vnd.apache.parquet'}
+
+
+def select_rows(df, BD=None, disciplines=None):
+    """
+    Returns the positions of the rows of df from any of the given BDs and
+    disciplines, picked as build_second_map picks them: exactly ['All BDs']
+    or ['All'] keeps every value, and None leaves that column unfiltered.
+    """
+    keep = np.ones(len(df), dtype=bool)
+    for column, values, everything in [('brand_developer', BD, 'All BDs'),
+                                       ('discipline', disciplines, 'All')]:
+        if values is not None and values != [everything]:
+            keep &= df[column].isin(values).values
+    return np.flatnonzero(keep)
+
+
+def _chunks(df, rows, chunk_rows):
+    # Only one chunk of rows is copied out of df at a time.
+    for start in range(0, len(rows), chunk_rows):
+        yield df.iloc[rows[start: start + chunk_rows]]
+
+
+def csv_chunks(df, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """ Yields the given rows of df as CSV text, a chunk at a time. """
+    yield df.iloc[:0].to_csv(index=False)
+    for chunk in _chunks(df, rows, chunk_rows):
+        yield chunk.to_csv(index=False, header=False)
+
+
+class _Sink(object):
+    """ Write-only file that hands back what was written since last drained. """
+
+    def __init__(self):
+        self.written = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.written)
+        self.written = []
+        return data
+
+
+def parquet_chunks(df, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """ Yields the given rows of df as a Parquet file, a row group at a time. """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sink = _Sink()
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    # Empty object columns come out as null; they hold free text.
+    for i, field in enumerate(schema):
+        if field.type == pa.null():
+            schema = schema.set(i, field.with_type(pa.string()))
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in _chunks(df, rows, chunk_rows):
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema,
+                                                preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream(df, rows, fmt):
+    """
+    Input: Pandas DataFrame, row positions from select_rows and a FORMATS key
+    Output: generator of the export's text or bytes
+    Raises ImportError for parquet if pyarrow is not installed, before
+    anything is sent.
+    """
+    if fmt == 'parquet':
+        import pyarrow.parquet  # noqa: F401
+        return parquet_chunks(df, rows)
+    return csv_chunks(df, rows)
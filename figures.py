@@ -0,0 +1,251 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+import fohr_theme_light  # noqa: F401 - registers the default template
+import metrics
+
+# Above this many events a map bins them by location instead of drawing a
+# marker per event. Bins keep MAP_BIN_DECIMALS of lat/lon (1 is about 11km),
+# or fewer if that still leaves more than MAP_POINT_THRESHOLD bins.
+MAP_POINT_THRESHOLD = int(os.environ.get('MAP_POINT_THRESHOLD', 5000))
+MAP_BIN_DECIMALS = int(os.environ.get('MAP_BIN_DECIMALS', 1))
+
+# Figures are built as plain dicts rather than go.Figure objects, which
+# skips plotly's property validation. The parts every figure shares are
+# worked out once here, including the default template go.Figure would
+# have embedded.
+TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+
+MAP_LAYOUT = {
+    'template': TEMPLATE,
+    'plot_bgcolor': 'Black',
+    'showlegend': True,
+    'geo': {
+        'bgcolor': 'black',
+        'resolution': 110,
+        'scope': 'usa',
+        'landcolor': 'white',
+        'showland': True,
+        'showocean': False,
+        'showcoastlines': True,
+    }
+}
+
+MAP_MARKER = {'line': {'color': 'rgb(40,40,40)', 'width': 0.9},
+              'sizemode': 'area'}
+
+AUDIENCE_HOVER = ("BD: <b>%{text}</b><br><br>" +
+                  "Audience: %{customdata}<br>" +
+                  '<extra></extra>')
+SHOP_HOVER = ("BD: <b>%{text}</b><br><br>" +
+              "Shop Name: %{customdata}<br>" +
+              '<extra></extra>')
+BINNED_HOVER = ("BD: <b>%{text}</b><br><br>" +
+                "Audience: %{customdata[0]}<br>" +
+                "Events: %{customdata[1]}<br>" +
+                '<extra></extra>')
+
+# Audience column and trace name of each activation on the main map.
+MAIN_MAP_TRACES = [('demo_bob', "Demo"),
+                   ('clinic_staff_count', "Clinic"),
+                   ('festival_bob', 'Festival'),
+                   ('vip_bob', 'VIP Event'),
+                   ('trail_building_total_attendance', "Trail Day"),
+                   ('other_activation_bob', 'Other Test Rides')]
+
+# Columns summed into the audience of an event on the discipline map.
+AUDIENCE_COLUMNS = ['demo_bob', 'clinic_staff_count',
+                    'festival_total_attendance', 'festival_bob',
+                    'vip_total_attendance', 'vip_bob', 'other_activation_bob']
+
+
+def _coordinates(values):
+    # float32 coordinates print with ~15 digits; 5 decimals is about 1m.
+    return np.round(np.asarray(values, dtype='float64'), 5)
+
+
+def geo_trace(name, lon, lat, text, customdata, hovertemplate, **marker):
+    """
+    Returns a Scattergeo trace as a plain dict.
+
+    Input: trace name, per-point arrays/Series and hover template, plus any
+           marker properties to set on top of MAP_MARKER (e.g. size)
+    """
+    return {
+        'type': 'scattergeo',
+        'name': name,
+        'lon': _coordinates(lon),
+        'lat': _coordinates(lat),
+        'text': np.asarray(text, dtype=object),
+        'customdata': np.asarray(customdata),
+        'marker': dict(MAP_MARKER, **marker),
+        'hovertemplate': hovertemplate,
+    }
+
+
+def map_figure(traces):
+    """ Returns a map figure dict with the shared MAP_LAYOUT. """
+    return {'data': traces, 'layout': MAP_LAYOUT}
+
+
+def bin_points(lon, lat, bd, audience, decimals=MAP_BIN_DECIMALS,
+               limit=MAP_POINT_THRESHOLD):
+    """
+    Groups points that share a location rounded to decimals, rounding more
+    coarsely while there would still be over limit groups.
+
+    Input: per-point arrays
+    Output: Pandas DataFrame with a row per location and columns lon, lat
+            (the mean position of its points), text (the BD, or e.g. '3 BDs'
+            when several share the location), audience (summed) and events
+            (number of points)
+    """
+    lon = np.asarray(lon, dtype='float64')
+    lat = np.asarray(lat, dtype='float64')
+    bd = np.asarray(bd, dtype=object)
+    audience = np.asarray(audience, dtype='float64')
+    located = ~(np.isnan(lon) | np.isnan(lat))
+    if not located.all():
+        lon, lat, bd, audience = (lon[located], lat[located], bd[located],
+                                  audience[located])
+    while True:
+        # One integer per grid cell; latitude cells never reach 10**6.
+        cell = (np.round(lon * 10 ** decimals) * 10 ** 6
+                + np.round(lat * 10 ** decimals))
+        codes, cells = pd.factorize(cell)
+        if len(cells) <= limit or decimals <= 0:
+            break
+        decimals -= 1
+    bins = len(cells)
+    events = np.bincount(codes, minlength=bins)
+    bd_codes, bd_names = pd.factorize(bd)
+    named = bd_codes >= 0
+    pairs = np.unique(codes[named] * len(bd_names) + bd_codes[named])
+    bds = np.bincount(pairs // max(len(bd_names), 1), minlength=bins)
+    text = bd[np.unique(codes, return_index=True)[1]]
+    several = bds > 1
+    text[several] = [f'{n} BDs' for n in bds[several]]
+    return pd.DataFrame({
+        'lon': np.bincount(codes, weights=lon, minlength=bins) / events,
+        'lat': np.bincount(codes, weights=lat, minlength=bins) / events,
+        'text': text,
+        'audience': np.bincount(codes, weights=audience,
+                                minlength=bins).astype('int64'),
+        'events': events})
+
+
+def _audience_trace(name, lon, lat, bd, audience, scale, binned):
+    if not binned:
+        return geo_trace(name, lon, lat, bd, audience, AUDIENCE_HOVER,
+                         size=audience / scale)
+    bins = bin_points(lon, lat, bd, audience)
+    return geo_trace(name, bins['lon'], bins['lat'], bins['text'],
+                     bins[['audience', 'events']].values, BINNED_HOVER,
+                     size=bins['audience'].values / scale)
+
+
+def _shop_assist_trace(df, lon, lat, bd, binned, **marker):
+    shop = np.asarray(df['shop_assist_retailer'], dtype=object)
+    rows = df['shop_assist_retailer'].notna().values
+    if not binned:
+        return geo_trace("Shop Assist", lon[rows], lat[rows], bd[rows],
+                         shop[rows], SHOP_HOVER, symbol='star-diamond',
+                         size=10, **marker)
+    bins = bin_points(lon[rows], lat[rows], bd[rows], np.zeros(rows.sum()))
+    return geo_trace("Shop Assist", bins['lon'], bins['lat'], bins['text'],
+                     bins[['audience', 'events']].values, BINNED_HOVER,
+                     symbol='star-diamond', size=10, **marker)
+
+
+@metrics.figure_stage
+def main_map(df, scale=.07, binned=None):
+    """
+    Returns the map with a trace per activation type in MAIN_MAP_TRACES,
+    sized by audience, plus the shop assists.
+
+    Each trace's rows come from one comparison on numpy arrays that are
+    pulled out of the frame once. Events are binned by location when
+    binned is set, or by default when there are over MAP_POINT_THRESHOLD.
+    """
+    if binned is None:
+        binned = len(df) > MAP_POINT_THRESHOLD
+    lon = df['longitude'].values
+    lat = df['latitude'].values
+    bd = np.asarray(df['brand_developer'], dtype=object)
+    traces = []
+    for key, name in MAIN_MAP_TRACES:
+        audience = df[key].values
+        rows = audience > 0
+        traces.append(_audience_trace(name, lon[rows], lat[rows], bd[rows],
+                                      audience[rows], scale, binned))
+    traces.append(_shop_assist_trace(df, lon, lat, bd, binned))
+    return map_figure(traces)
+
+
+@metrics.figure_stage
+def discipline_map(df, disciplines, scale=.1, binned=None):
+    """
+    Returns the map with a trace per discipline, sized by total audience,
+    plus the shop assists.
+
+    The rows of every discipline come from a single groupby pass. Binning
+    works as in main_map.
+    """
+    if binned is None:
+        binned = len(df) > MAP_POINT_THRESHOLD
+    audience = df[AUDIENCE_COLUMNS].sum(axis=1).values
+    lon = df['longitude'].values
+    lat = df['latitude'].values
+    bd = np.asarray(df['brand_developer'], dtype=object)
+    positions = df.groupby('discipline', observed=True, sort=False).indices
+    no_rows = np.array([], dtype=int)
+    traces = []
+    for discipline in disciplines:
+        rows = positions.get(discipline, no_rows)
+        traces.append(_audience_trace(discipline, lon[rows], lat[rows],
+                                      bd[rows], audience[rows], scale, binned))
+    traces.append(_shop_assist_trace(df, lon, lat, bd, binned,
+                                     color="#FF6692"))
+    return map_figure(traces)
+
+
+# Bonus metric, trace name, color and title of each weekly bar chart.
+BAR_CHARTS = [('total_bob', 'Total B.O.B.', 'rgba(168, 168, 168, 0.7)',
+               'Total Butts on Bikes'),
+              ('activation', 'Total Activations', '#19d3f3',
+               'Total Activations'),
+              ('clinics', 'Total Activations', '#00cc96', 'Total Clinics'),
+              ('trail_day', 'Total Trail Days', '#ab63fa',
+               'Total Trail Building Days')]
+
+BAR_HOVER = '<b>Week</b>:   %{x}' + '<br>Count:  %{y}'
+
+BAR_LAYOUT = {
+    'template': TEMPLATE,
+    'xaxis': {'title': {'text': 'Week'}, 'showgrid': False,
+              'zeroline': False},
+    'yaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False},
+}
+
+
+@metrics.figure_stage
+def bar_charts(df, bd_name):
+    """
+    Returns a bar figure per BAR_CHARTS entry, with a bar per week.
+
+    Input: Pandas DataFrame from rollup.bonus_metrics by 'Week', without
+           NaNs, and the BD shown in the titles
+    """
+    weeks = df.index.values
+    figs = []
+    for column, name, color, title in BAR_CHARTS:
+        counts = df[column].values
+        trace = {'type': 'bar', 'name': name, 'x': weeks, 'y': counts,
+                 'text': counts, 'textposition': 'auto',
+                 'marker': {'color': color}, 'hovertemplate': BAR_HOVER}
+        layout = dict(BAR_LAYOUT, title={'text': f'{title} - {bd_name}'})
+        figs.append({'data': [trace], 'layout': layout})
+    return figs
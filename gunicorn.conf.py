@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for the dashboard, read by `gunicorn app:server` when
+started from this directory.
+
+Workers are gthread workers, processes running GUNICORN_THREADS threads
+each, so a slow callback holds up one thread rather than a whole worker.
+Callbacks are mostly pandas and plotly work, which gevent could not run
+concurrently, so threads are the supported mode.
+
+The app is preloaded: the snapshot is loaded (or the sheet pulled) and its
+rollup cube built once in the master process, and the forked workers
+share those pages copy-on-write instead of each building their own. The
+sheet refresher is started in every worker after the fork.
+
+Each worker writes its metrics to METRICS_DIR (by default a directory
+of this server's own), which is emptied when the server starts, and
+/metrics sums them.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+# Removed again on exit, unless METRICS_DIR was set.
+_metrics_dir = None
+if 'METRICS_DIR' not in os.environ:
+    _metrics_dir = os.environ['METRICS_DIR'] = os.path.join(
+        tempfile.gettempdir(), f'google_dashboard_metrics_{os.getpid()}')
+
+import metrics  # noqa: E402
+import refresher  # noqa: E402
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Threads don't survive fork(), so app.py's refresher waits for post_fork.
+refresher.defer()
+
+
+def on_starting(server):
+    metrics.clear()
+
+
+def on_exit(server):
+    if _metrics_dir:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
+
+
+def when_ready(server):
+    # Objects allocated while preloading are left out of garbage collection,
+    # which would otherwise write to them and copy their pages per worker.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    metrics.reset()
+    refresher.start_deferred()
+
+
+def worker_exit(server, worker):
+    # What the worker recorded since its last flush.
+    metrics.flush()
@@ -0,0 +1,311 @@
+import bisect
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, request
+
+# Print a JSON line for every instrumented call and callback request.
+METRICS_LOG = os.environ.get('METRICS_LOG') == '1'
+
+# Directory every worker process writes its metrics to, so that /metrics
+# sums them whichever worker answers the scrape; '' (the default outside
+# gunicorn.conf.py) keeps them per process.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+# Seconds between writes of a worker's metrics to METRICS_DIR.
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+SECONDS_BUCKETS = [.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1e3, 1e4, 1e5, 1e6, 1e7]
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_local = threading.local()
+# Process the flusher thread was started in; threads don't survive fork.
+_flusher_pid = None
+
+
+class Histogram:
+    """ Prometheus histogram with one series per combination of labels. """
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        # le buckets are cumulative; each value is counted in its smallest
+        # bucket here and summed up in render.
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.setdefault(
+                key, [[0] * len(self.buckets), 0, 0])
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def dump(self):
+        """ Returns this process's series as JSON-ready [key, value] pairs. """
+        with _lock:
+            return [[key, [list(counts), total, count]]
+                    for key, (counts, total, count) in self._series.items()]
+
+    @staticmethod
+    def merge(merged, dumped):
+        """ Adds series from dump() into the dict merged. """
+        for key, (counts, total, count) in dumped:
+            key = tuple(map(tuple, key))
+            into = merged.setdefault(key, [[0] * len(counts), 0, 0])
+            into[0] = [a + b for a, b in zip(into[0], counts)]
+            into[1] += total
+            into[2] += count
+
+    def render(self, series):
+        lines = [f'# HELP {self.name} {self.help}',
+                 f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = ','.join(f'{k}="{v}"' for k, v in key)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} '
+                             f'{cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    """ Prometheus counter with one series per combination of labels. """
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+
+    def inc(self, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._series[key] = self._series.get(key, 0) + 1
+
+    def dump(self):
+        """ Returns this process's series as JSON-ready [key, value] pairs. """
+        with _lock:
+            return [[key, value] for key, value in self._series.items()]
+
+    @staticmethod
+    def merge(merged, dumped):
+        """ Adds series from dump() into the dict merged. """
+        for key, value in dumped:
+            key = tuple(map(tuple, key))
+            merged[key] = merged.get(key, 0) + value
+
+    def render(self, series):
+        lines = [f'# HELP {self.name} {self.help}',
+                 f'# TYPE {self.name} counter']
+        for key, value in sorted(series.items()):
+            labels = ','.join(f'{k}="{v}"' for k, v in key)
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+CALLBACK_SECONDS = Histogram(
+    'dashboard_callback_seconds',
+    'Wall time of an instrumented callback or builder.', SECONDS_BUCKETS)
+STAGE_SECONDS = Histogram(
+    'dashboard_callback_stage_seconds',
+    'Time a callback spent building figures, and on everything else '
+    '(pandas).', SECONDS_BUCKETS)
+CACHE_RESULTS = Counter(
+    'dashboard_callback_cache_total',
+    'Memoized calls answered by the local cache (hit), the shared backend '
+    '(shared) or by running the callback (miss).')
+REQUEST_SECONDS = Histogram(
+    'dashboard_request_seconds',
+    'Time to answer a Dash callback request.', SECONDS_BUCKETS)
+REQUEST_BYTES = Histogram(
+    'dashboard_request_bytes',
+    'Size of the inputs of a Dash callback request.', BYTES_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'dashboard_response_bytes',
+    'Size of the outputs of a Dash callback response.', BYTES_BUCKETS)
+
+METRICS = [CALLBACK_SECONDS, STAGE_SECONDS, CACHE_RESULTS,
+           REQUEST_SECONDS, REQUEST_BYTES, RESPONSE_BYTES]
+
+
+def log(event, **fields):
+    """ Prints a structured log line if METRICS_LOG is set. """
+    if METRICS_LOG:
+        print(json.dumps(dict(event=event, **fields)))
+
+
+def instrumented(func):
+    """
+    Records the wall time of func, the part of it spent in figure_stage
+    functions, and whether memoize answered it from cache.
+    Put it above @memoize so cache hits are counted.
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        outer = getattr(_local, 'record', None)
+        record = _local.record = {'figure': 0.0, 'cache': None}
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            _local.record = outer
+            if outer is not None:
+                outer['figure'] += record['figure']
+            name = func.__name__
+            CALLBACK_SECONDS.observe(seconds, callback=name)
+            STAGE_SECONDS.observe(record['figure'], callback=name,
+                                  stage='figure')
+            STAGE_SECONDS.observe(seconds - record['figure'], callback=name,
+                                  stage='pandas')
+            if record['cache']:
+                CACHE_RESULTS.inc(callback=name, result=record['cache'])
+            log('callback', callback=name, seconds=round(seconds, 6),
+                figure_seconds=round(record['figure'], 6),
+                cache=record['cache'])
+    return wrapper
+
+
+def figure_stage(func):
+    """ Counts the time spent in func as figure building. """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record = getattr(_local, 'record', None)
+            if record is not None:
+                record['figure'] += time.perf_counter() - start
+    return wrapper
+
+
+def cache_result(result):
+    """ Notes how memoize answered the current instrumented call. """
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record['cache'] = result
+
+
+def track_requests(server, app):
+    """
+    Records the time and the request and response sizes of every Dash
+    callback request, labelled by the callback that answered it.
+    """
+    @server.before_request
+    def start_timer():
+        if request.path.endswith('/_dash-update-component'):
+            g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        output = (request.get_json(silent=True) or {}).get('output', '')
+        func = app.callback_map.get(output, {}).get('callback')
+        name = getattr(func, '__name__', output)
+        size = response.calculate_content_length() or 0
+        REQUEST_SECONDS.observe(seconds, callback=name)
+        REQUEST_BYTES.observe(request.content_length or 0, callback=name)
+        RESPONSE_BYTES.observe(size, callback=name)
+        log('request', callback=name, status=response.status_code,
+            seconds=round(seconds, 6), request_bytes=request.content_length,
+            response_bytes=size)
+        start_flusher()
+        return response
+
+
+def start_flusher():
+    """
+    Starts a thread writing this process's metrics to METRICS_DIR every
+    METRICS_FLUSH_INTERVAL seconds, unless one is running already.
+    """
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flush_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            flush()
+    threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+
+
+def flush():
+    """
+    Writes this process's metrics to METRICS_DIR/<pid>.json.
+    Files of workers that have exited are kept, so the summed counters
+    never go down.
+    """
+    if not METRICS_DIR:
+        return
+    # One writer at a time, so an older dump never replaces a newer one.
+    with _flush_lock:
+        data = {m.name: m.dump() for m in METRICS}
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, os.path.join(METRICS_DIR, f'{os.getpid()}.json'))
+
+
+def reset():
+    """
+    Forgets every recorded value. Called in each new worker, which would
+    otherwise report what its parent process recorded as its own.
+    """
+    with _lock:
+        for m in METRICS:
+            m._series.clear()
+
+
+def clear():
+    """ Deletes the metrics of earlier runs from METRICS_DIR. """
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        os.remove(os.path.join(METRICS_DIR, name))
+
+
+def render():
+    """
+    Returns every metric in the Prometheus text format, summed over the
+    processes that wrote to METRICS_DIR.
+    """
+    merged = {m.name: {} for m in METRICS}
+    if METRICS_DIR:
+        flush()
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for m in METRICS:
+                m.merge(merged[m.name], data.get(m.name, []))
+    else:
+        for m in METRICS:
+            m.merge(merged[m.name], m.dump())
+    return '\n'.join(line for m in METRICS
+                     for line in m.render(merged[m.name])) + '\n'
@@ -0,0 +1,62 @@
+import os
+import threading
+
+# Seconds between background pulls of the google sheet; 0 disables refreshing.
+REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', 600))
+
+# start_refresher() calls held back by defer(), or None when not deferring.
+_deferred = None
+
+
+def defer():
+    """
+    Holds back start_refresher() calls until start_deferred().
+
+    Threads don't survive a fork, so a server that imports the app before
+    forking workers (gunicorn's preload_app) starts the refresher in each
+    worker instead.
+    """
+    global _deferred
+    _deferred = []
+
+
+def start_deferred():
+    """ Starts the refreshers held back by defer(). """
+    global _deferred
+    pending, _deferred = _deferred or [], None
+    for args in pending:
+        start_refresher(*args)
+
+
+def start_refresher(refresh, interval=REFRESH_INTERVAL, immediately=False):
+    """
+    Calls refresh() every interval seconds on a daemon thread, and straight
+    away as well if immediately is set.
+
+    A failed refresh is printed and the previous snapshot keeps serving.
+
+    Input: function that pulls the sheet and stores a new snapshot
+    Output: threading.Event that stops the refresher when set, or None
+            if refreshing is disabled or deferred
+    """
+    if interval <= 0 and not immediately:
+        return None
+    if _deferred is not None:
+        _deferred.append((refresh, interval, immediately))
+        return None
+    stop = threading.Event()
+
+    def run():
+        wait = 0 if immediately else interval
+        while not stop.wait(wait):
+            try:
+                refresh()
+            except Exception as e:
+                print(f'Sheet refresh failed: {e}')
+            if interval <= 0:
+                break
+            wait = interval
+
+    thread = threading.Thread(target=run, name='sheet-refresher', daemon=True)
+    thread.start()
+    return stop
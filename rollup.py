@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+import datastore
+
+BOB_COLUMNS = ['demo_bob', 'festival_bob', 'vip_bob', 'other_activation_bob']
+
+# Activation types counted by each bonus table column.
+BONUS_METRICS = {
+    'clinics': lambda kind: kind == 'Clinic',
+    'activation': lambda kind: (kind != 'Clinic') & (kind != 'Trail Day'),
+    'trail_day': lambda kind: kind == 'Trail building day',
+}
+
+# The cube has one row per combination of these present in the events.
+DIMENSIONS = ['date', 'Week', 'year_quarter', 'brand_developer',
+              'discipline', 'activation_type']
+
+
+def build_cube(df):
+    """
+    Rolls the events up to one row per DIMENSIONS combination.
+
+    Input: cleaned, date-sorted Pandas DataFrame
+    Output: Pandas DataFrame, sorted by date, with the dimensions and the
+            measures rows (events), events (events with a name), bob
+            (butts on bikes), staff (clinic staff) and trail_attendance
+    """
+    df = df.loc[df['date'].notna()]
+    measures = pd.DataFrame({
+        'rows': 1,
+        'events': df['event_name'].notna().astype(int),
+        'bob': df[BOB_COLUMNS].sum(axis=1),
+        'staff': df['clinic_staff_count'],
+        'trail_attendance': df['trail_building_total_attendance']})
+    # Group on category codes so blank answers (-1) are kept as a group.
+    keys = [df[d].cat.codes if df[d].dtype.name == 'category'
+            else df[d].astype(int) if d == 'Week' else df[d]
+            for d in DIMENSIONS]
+    cube = measures.groupby(keys, sort=True).sum().reset_index()
+    cube.columns = DIMENSIONS + list(measures.columns)
+    for d in DIMENSIONS:
+        if df[d].dtype.name == 'category':
+            cube[d] = pd.Categorical.from_codes(
+                cube[d], categories=df[d].cat.categories)
+    return cube
+
+
+def cube(key):
+    """
+    Returns the rollup cube for the frame stored under a datastore key.
+    Date and quarter views slice the snapshot's cube, which is only built
+    once per snapshot.
+    """
+    return datastore.derived(key, 'cube', build_cube)
+
+
+def filter_cube(cube, BD, ride_type):
+    """
+    Returns the cube rows for the brand developers and disciplines picked
+    in the dropdowns; 'All BDs' / 'All' leave that dimension unfiltered.
+    """
+    mask = pd.Series(True, index=cube.index)
+    if BD != ['All BDs']:
+        mask &= cube['brand_developer'].isin(BD)
+    if ride_type != ['All']:
+        mask &= cube['discipline'].isin(ride_type)
+    return cube.loc[mask]
+
+
+def bonus_metrics(cube, by):
+    """
+    Returns total_bob and an event count for each BONUS_METRICS entry, for
+    each value of by (e.g. 'brand_developer', 'Week' or 'year_quarter').
+    Counts are NaN where no event of that kind happened.
+
+    Every metric is a masked copy of the events measure, so all of them
+    come out of a single groupby.
+    """
+    kind = cube['activation_type']
+    columns = {'total_bob': cube['bob']}
+    for name, picks in BONUS_METRICS.items():
+        mask = picks(kind)
+        columns[name] = cube['events'].where(mask, 0)
+        columns[name + '_rows'] = mask.astype(int)
+    df = pd.DataFrame(columns).groupby(cube[by], observed=True).sum()
+    for name in BONUS_METRICS:
+        df[name] = df[name].where(df.pop(name + '_rows') > 0)
+    return df
+
+
+# Dimensions listed in a summary, in order of first appearance.
+SUMMARY_DIMENSIONS = ['brand_developer', 'discipline', 'year_quarter']
+SUMMARY_MEASURES = ['bob', 'rows', 'staff']
+
+
+def summary(key):
+    """
+    Returns what the browser needs to fill in the dropdown options and the
+    KPI labels for a datastore frame, as a small columnar dict: a list of
+    the names in each SUMMARY_DIMENSIONS column, and the SUMMARY_MEASURES
+    summed per brand developer and discipline pair. 'pairs' holds those
+    sums in parallel lists, with each pair's BD and discipline given as
+    indices into the name lists (-1 for a blank answer).
+    """
+    df = datastore.get(key)
+    names = {d: [v for v in df[d].unique() if pd.notna(v)]
+             for d in SUMMARY_DIMENSIONS}
+    rolled = cube(key)
+    codes = []
+    for d in ['brand_developer', 'discipline']:
+        # Map category codes to positions in names[d]; code -1 stays -1.
+        positions = pd.Index(names[d]).get_indexer(rolled[d].cat.categories)
+        codes.append(np.append(positions, -1)[rolled[d].cat.codes.values])
+    pairs = rolled[SUMMARY_MEASURES].groupby(codes).sum()
+    columns = {'brand_developer': pairs.index.get_level_values(0).tolist(),
+               'discipline': pairs.index.get_level_values(1).tolist()}
+    for m in SUMMARY_MEASURES:
+        columns[m] = pairs[m].tolist()
+    return dict(names, pairs=columns)
@@ -0,0 +1,131 @@
+import pandas as pd
+
+# Bump whenever clean_rows changes the columns or dtypes it produces, so
+# snapshots saved by older code are not loaded.
+SCHEMA_VERSION = 4
+
+# Cleaned name and dtype of every column of the form responses sheet, in
+# sheet order. 'object' columns hold free text, with NaN for blank answers;
+# answers drawn from a short list of BDs, places and shops are categories.
+COLUMNS = [('timestamp', 'object'),
+           ('brand_developer', 'category'),
+           ('event_name', 'object'),
+           ('date', 'datetime64[ns]'),
+           ('Location City (closest)', 'category'),
+           ('Location State', 'category'),
+           ('Location Zip Code', 'category'),
+           ('activation_type', 'category'),
+           ('discipline', 'category'),
+           ('demo_retailer', 'category'),
+           ('demo_bob', 'int32'),
+           ('clinic_retailer', 'category'),
+           ('clinic_shop_level', 'category'),
+           ('clinic_staff_count', 'int32'),
+           ('festival_retail_partner', 'category'),
+           ('festival_total_attendance', 'int32'),
+           ('festival_bob', 'int32'),
+           ('vip_retailer', 'category'),
+           ('vip_total_attendance', 'int32'),
+           ('vip_bob', 'int32'),
+           ('trail_building_retailer', 'category'),
+           ('trail_building_total_attendance', 'int32'),
+           ('shop_assist_retailer', 'category'),
+           ('shop_assist_description', 'object'),
+           ('other_activation_retailer', 'category'),
+           ('other_activation_description', 'object'),
+           ('other_activation_bob', 'int32'),
+           ('latitude', 'float32'),
+           ('longitude', 'float32')]
+
+# Columns clean_rows adds, derived from date.
+DERIVED = [('Week', 'UInt8'),
+           ('quarter', 'category'),
+           ('year', 'category'),
+           ('year_quarter', 'category')]
+
+# Answers the form leaves blank.
+MISSING = ['', 'None']
+
+
+def _parse(raw, dtype, name):
+    """
+    Converts one raw column of sheet strings to dtype.
+
+    Dates and numbers repeat a lot, so each distinct string is parsed once
+    and the results are spread back over the rows by their factorized codes.
+    Values that can't be parsed are reported and treated as blank.
+    """
+    raw = raw.mask(raw.isin(MISSING))
+    if dtype == 'object':
+        return raw
+    if dtype == 'category':
+        return raw.astype('category')
+    codes, uniques = pd.factorize(raw)
+    uniques = pd.Series(uniques, dtype=object)
+    if dtype == 'datetime64[ns]':
+        parsed = pd.to_datetime(uniques, errors='coerce')
+    else:
+        parsed = pd.to_numeric(uniques, errors='coerce')
+    invalid = parsed.isna().values
+    if invalid.any():
+        count = int(invalid[codes[codes >= 0]].sum())
+        print(f'{count} unreadable values in {name} treated as blank.')
+    if dtype == 'int32':
+        col = parsed.fillna(0).astype(dtype).reindex(codes, fill_value=0)
+    else:
+        col = parsed.astype(dtype).reindex(codes)
+    col.index = raw.index
+    return col
+
+
+def clean_rows(df):
+    """
+    Renames the raw form columns, converts each to its COLUMNS dtype and
+    adds the Week, quarter, year and year_quarter columns.
+    Rows are sorted by date so date ranges can be found by binary search.
+
+    Input: Pandas DataFrame from gsheet_to_df
+    Output: cleaned Pandas DataFrame
+    """
+    df = pd.DataFrame({name: _parse(df.iloc[:, i], dtype, name)
+                       for i, (name, dtype) in enumerate(COLUMNS)})
+    year = df['date'].dt.year
+    quarter = df['date'].dt.quarter
+    df['Week'] = df['date'].dt.isocalendar().week.astype('UInt8')
+    df['quarter'] = _labelled(quarter, lambda q: f'{q:.0f}')
+    df['year'] = _labelled(year, lambda y: f'{y:.0f}')
+    df['year_quarter'] = _labelled(year * 10 + quarter,
+                                   lambda yq: f'{yq // 10:.0f} Q{yq % 10:.0f}')
+    return df.sort_values('date', kind='mergesort', ignore_index=True)
+
+
+def _labelled(values, label):
+    # Categorical of label(value), formatting each distinct value only once.
+    values = values.astype('category')
+    return values.cat.rename_categories(
+        [label(v) for v in values.cat.categories])
+
+
+def concat(frames):
+    """
+    Appends cleaned frames, keeping category columns as categories even
+    when the frames have different categories, and keeping rows sorted by
+    date. The sort is stable, so rows with the same date stay in sheet order.
+    """
+    df = pd.concat(frames, ignore_index=True)
+    for name, dtype in COLUMNS + DERIVED:
+        if dtype == 'category' and df[name].dtype != 'category':
+            df[name] = df[name].astype('category')
+    return df.sort_values('date', kind='mergesort', ignore_index=True)
+
+
+def memory_report(df):
+    """
+    Returns the bytes each column of df uses, largest first.
+
+    Input: Pandas DataFrame
+    Output: Pandas DataFrame indexed by column with 'dtype' and 'bytes'
+    """
+    report = pd.DataFrame({'dtype': df.dtypes.astype(str),
+                           'bytes': df.memory_usage(deep=True, index=False)})
+    return report.sort_values('bytes', ascending=False)
@@ -0,0 +1,133 @@
+import pandas as pd
+import os
+
+from sources import A1_RANGE, identity, source
+
+# The A1 range of the form responses in the sheet.
+RANGE_NAME = os.environ.get('RANGE_NAME', 'Form Responses 1!A1:AC')
+
+# Only fetch rows appended since the last pull, with a full pull every
+# FULL_SYNC_EVERY syncs to pick up edits to older rows.
+INCREMENTAL_SYNC = os.environ.get('INCREMENTAL_SYNC', '1') == '1'
+FULL_SYNC_EVERY = int(os.environ.get('FULL_SYNC_EVERY', 12))
+
+_sync = {'header': None, 'rows': 0, 'last_row': None, 'since_full': 0}
+
+
+def source_identity():
+    """ Returns the data source and range the form responses are read from. """
+    return f'{identity()}!{RANGE_NAME}'
+
+
+def get_google_sheet(range_name=RANGE_NAME):
+    """
+    Returns all values from the target google sheet, or from the stand-in
+    picked by DATA_SOURCE.
+    """
+    values = source().get(range_name)
+
+    if not values:
+        print('No data found.')
+    else:
+        return values
+
+
+def gsheet_to_df(values):
+    """
+    Converts Google sheet API data to Pandas DataFrame
+
+    The API leaves out blank cells at the end of a row, so short rows are
+    padded with blanks to the header's width.
+
+    Input: Google API service.spreadsheets().get() values
+    Output: Pandas DataFrame with all data from Google Sheet
+    """
+    header = values[0]
+    rows = values[1:]
+    width = len(header)
+    rows = [row if len(row) >= width else row + [''] * (width - len(row))
+            for row in rows]
+    if not rows:
+        print('No data found.')
+    else:
+        df = pd.DataFrame(columns=header, data=rows)
+    return df
+
+
+def appended_range(range_name, first_row):
+    """
+    Returns the A1 range that starts at sheet row first_row and keeps the
+    columns and any end row of range_name, or None if range_name can't be
+    narrowed.
+
+    e.g. appended_range('Form Responses 1!A1:AC', 250) -> 'Form Responses 1!A250:AC'
+         appended_range('Sheet!A1:AC500', 250) -> 'Sheet!A250:AC500'
+    """
+    match = A1_RANGE.match(range_name)
+    if not match or (match['end_row'] and first_row > int(match['end_row'])):
+        return None
+    sheet = f"{match['sheet']}!" if match['sheet'] else ''
+    return (f"{sheet}{match['start_col']}{first_row}:"
+            f"{match['end_col']}{match['end_row']}")
+
+
+def sync_state():
+    """ Returns what sync_google_sheet() remembers about the last pull. """
+    return dict(_sync)
+
+
+def restore_sync_state(state):
+    """
+    Continues syncing from a pull made elsewhere, e.g. by another worker.
+
+    Input: dict from sync_state()
+    """
+    _sync.update(state)
+
+
+def _full_sync():
+    values = get_google_sheet() or []
+    _sync['header'] = values[0] if values else None
+    _sync['rows'] = max(len(values) - 1, 0)
+    _sync['last_row'] = values[-1] if len(values) > 1 else None
+    _sync['since_full'] = 0
+    return values, True
+
+
+def sync_google_sheet():
+    """
+    Returns the sheet rows that have not been seen yet.
+
+    The sheet is an append-only form log, so after the first pull only the
+    last row already seen and everything below it is requested. If that row
+    has changed or disappeared, older rows have been edited and the whole
+    range is pulled again.
+
+    Output: (values, full) - values is a header row followed by data rows, as
+            from get_google_sheet(); full is True when values holds the whole
+            sheet rather than only the appended rows
+    """
+    if (not INCREMENTAL_SYNC or _sync['last_row'] is None
+            or _sync['since_full'] + 1 >= FULL_SYNC_EVERY):
+        return _full_sync()
+
+    match = A1_RANGE.match(RANGE_NAME)
+    if not match:
+        return _full_sync()
+    # Sheet row of the last data row already seen; the header is start_row.
+    last_seen = int(match['start_row'] or 1) + _sync['rows']
+    range_name = appended_range(RANGE_NAME, last_seen)
+    if range_name is None:
+        return _full_sync()
+
+    values = get_google_sheet(range_name) or []
+    if not values or values[0] != _sync['last_row']:
+        print('Sheet rows were edited, pulling the full sheet.')
+        return _full_sync()
+
+    new_rows = values[1:]
+    _sync['rows'] += len(new_rows)
+    if new_rows:
+        _sync['last_row'] = new_rows[-1]
+    _sync['since_full'] += 1
+    return [_sync['header']] + new_rows, False
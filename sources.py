@@ -0,0 +1,138 @@
+import csv
+import json
+import os
+import re
+
+# Where the form responses are read from: 'sheets' (the Google Sheets API),
+# 'local' (a CSV export of the sheet at LOCAL_SHEET) or 'synthetic'
+# (SYNTHETIC_ROWS made-up rows, see synthetic.py).
+DATA_SOURCE = os.environ.get('DATA_SOURCE', 'sheets')
+LOCAL_SHEET = os.environ.get('LOCAL_SHEET', 'sheet.csv')
+SYNTHETIC_ROWS = int(os.environ.get('SYNTHETIC_ROWS', 10000))
+SYNTHETIC_SEED = int(os.environ.get('SYNTHETIC_SEED', 0))
+
+A1_RANGE = re.compile(r"^(?:(?P<sheet>.+)!)?(?P<start_col>[A-Z]+)(?P<start_row>\d*)"
+                      r":(?P<end_col>[A-Z]+)(?P<end_row>\d*)$")
+
+_source = None
+
+
+class SheetsSource:
+    """
+    Reads ranges of the google sheet SPREADSHEET_ID through the Sheets API,
+    with the service account credentials in GDRIVE_AUTH.
+    """
+
+    # If modifying these scopes, delete the file token.pickle.
+    SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+
+    def __init__(self):
+        self.spreadsheet_id = os.environ['SPREADSHEET_ID']
+        self.creds = os.environ['GDRIVE_AUTH']
+        self._service = None
+
+    def service(self):
+        """
+        Returns the Sheets API client, building it on first use.
+
+        The client is built from the discovery document bundled with
+        google-api-python-client, so no discovery request goes over the
+        network. Its credentials and HTTP connection are reused by every
+        later call, and the access token is only re-minted once it has
+        expired.
+        """
+        if self._service is None:
+            from googleapiclient.discovery import build
+            from google.oauth2 import service_account
+            from google_auth_httplib2 import AuthorizedHttp
+            import httplib2
+            service_account_info = json.loads(self.creds)
+            creds = service_account.Credentials.from_service_account_info(
+                service_account_info, scopes=self.SCOPES)
+            http = AuthorizedHttp(creds, http=httplib2.Http())
+            self._service = build('sheets', 'v4', http=http,
+                                  cache_discovery=False, static_discovery=True)
+        return self._service
+
+    def get(self, range_name):
+        sheet = self.service().spreadsheets()
+        result = sheet.values().get(spreadsheetId=self.spreadsheet_id,
+                                    range=range_name).execute()
+        return result.get('values', [])
+
+
+def column_index(letters):
+    """ Returns the 0-based index of a sheet column, e.g. 'AC' -> 28. """
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+class LocalSource:
+    """
+    Serves sheet values held in memory the way the Sheets API serves a
+    range: rows and columns are cut to the A1 range (the sheet name is
+    ignored) and blank cells at the end of a row are left out.
+    """
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, range_name):
+        match = A1_RANGE.match(range_name)
+        if not match:
+            return self.values
+        first = int(match['start_row'] or 1) - 1
+        last = int(match['end_row']) if match['end_row'] else len(self.values)
+        start = column_index(match['start_col'])
+        end = column_index(match['end_col']) + 1
+        values = []
+        for row in self.values[first:last]:
+            row = row[start:end]
+            while row and row[-1] == '':
+                row = row[:-1]
+            values.append(row)
+        return values
+
+    def append(self, rows):
+        """ Adds rows below the last one, like new form responses. """
+        self.values.extend(rows)
+
+
+def get_source(name=DATA_SOURCE):
+    """
+    Returns the data source configured by DATA_SOURCE.
+    """
+    if name == 'sheets':
+        return SheetsSource()
+    if name == 'local':
+        with open(LOCAL_SHEET, newline='') as f:
+            return LocalSource(list(csv.reader(f)))
+    if name == 'synthetic':
+        import synthetic
+        return LocalSource(synthetic.values(SYNTHETIC_ROWS, SYNTHETIC_SEED))
+    raise ValueError(f'Unknown DATA_SOURCE {name!r}')
+
+
+def identity(name=DATA_SOURCE):
+    """
+    Returns a string naming the data DATA_SOURCE reads, e.g. the
+    spreadsheet id, so that data saved from one source is not served as
+    another's.
+    """
+    if name == 'sheets':
+        return f"sheets:{os.environ.get('SPREADSHEET_ID', '')}"
+    if name == 'local':
+        return f'local:{os.path.abspath(LOCAL_SHEET)}'
+    if name == 'synthetic':
+        return f'synthetic:{SYNTHETIC_ROWS}:{SYNTHETIC_SEED}'
+    return name
+
+
+def source():
+    """ Returns the configured data source, creating it on first use. """
+    global _source
+    if _source is None:
+        _source = get_source()
+    return _source
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+from schema import COLUMNS
+
+BRAND_DEVELOPERS = ['Alex Moreno', 'Jamie Chen', 'Sam Okafor', 'Taylor Brooks',
+                    'Jordan Reyes', 'Casey Novak', 'Riley Patel',
+                    'Morgan Lindqvist', 'Drew Harper', 'Quinn Alvarez',
+                    'Avery Johnson', 'Parker Sato']
+
+DISCIPLINES = ['Mountain', 'Road', 'Gravel', 'E-Bike', 'Kids']
+
+# Activation types and how often the form reports each.
+ACTIVATION_TYPES = [('Demo', .35), ('Clinic', .15), ('Festival', .1),
+                    ('VIP Event', .08), ('Trail building day', .07),
+                    ('Shop Assist', .15), ('Other', .1)]
+
+# City, state, zip, latitude and longitude of places events are held.
+PLACES = [('Boulder', 'CO', '80302', 40.015, -105.2705),
+          ('Denver', 'CO', '80202', 39.7392, -104.9903),
+          ('Durango', 'CO', '81301', 37.2753, -107.8801),
+          ('Bend', 'OR', '97701', 44.0582, -121.3153),
+          ('Portland', 'OR', '97205', 45.5152, -122.6784),
+          ('Hood River', 'OR', '97031', 45.7054, -121.5215),
+          ('Moab', 'UT', '84532', 38.5733, -109.5498),
+          ('Park City', 'UT', '84060', 40.6461, -111.498),
+          ('Salt Lake City', 'UT', '84101', 40.7608, -111.891),
+          ('Santa Cruz', 'CA', '95060', 36.9741, -122.0308),
+          ('San Francisco', 'CA', '94103', 37.7749, -122.4194),
+          ('Los Angeles', 'CA', '90012', 34.0522, -118.2437),
+          ('San Diego', 'CA', '92101', 32.7157, -117.1611),
+          ('Truckee', 'CA', '96161', 39.328, -120.1833),
+          ('Sedona', 'AZ', '86336', 34.8697, -111.761),
+          ('Tucson', 'AZ', '85701', 32.2226, -110.9747),
+          ('Bentonville', 'AR', '72712', 36.3729, -94.2088),
+          ('Austin', 'TX', '78701', 30.2672, -97.7431),
+          ('Minneapolis', 'MN', '55401', 44.9778, -93.265),
+          ('Duluth', 'MN', '55802', 46.7867, -92.1005),
+          ('Madison', 'WI', '53703', 43.0731, -89.4012),
+          ('Chicago', 'IL', '60601', 41.8781, -87.6298),
+          ('Asheville', 'NC', '28801', 35.5951, -82.5515),
+          ('Brevard', 'NC', '28712', 35.2334, -82.7343),
+          ('Atlanta', 'GA', '30303', 33.749, -84.388),
+          ('Burlington', 'VT', '05401', 44.4759, -73.2121),
+          ('Boston', 'MA', '02108', 42.3601, -71.0589),
+          ('New York', 'NY', '10001', 40.7128, -74.006),
+          ('Pittsburgh', 'PA', '15222', 40.4406, -79.9959),
+          ('Boise', 'ID', '83702', 43.615, -116.2023),
+          ('Missoula', 'MT', '59802', 46.8721, -113.994),
+          ('Bellingham', 'WA', '98225', 48.7519, -122.4787),
+          ('Seattle', 'WA', '98101', 47.6062, -122.3321)]
+
+RETAILERS = [f'{town} {kind}' for town in ['Summit', 'Canyon', 'Ridge',
+                                          'Valley', 'Trailhead', 'Riverside',
+                                          'Mesa', 'Pine']
+             for kind in ['Cyclery', 'Bike Shop', 'Bicycle Co']]
+
+SHOP_LEVELS = ['Level 1', 'Level 2', 'Level 3']
+
+# Columns each activation type fills in, and the upper bound of the counts.
+ACTIVATION_COLUMNS = {
+    'Demo': [('demo_retailer', RETAILERS), ('demo_bob', 80)],
+    'Clinic': [('clinic_retailer', RETAILERS),
+               ('clinic_shop_level', SHOP_LEVELS),
+               ('clinic_staff_count', 25)],
+    'Festival': [('festival_retail_partner', RETAILERS),
+                 ('festival_total_attendance', 3000), ('festival_bob', 250)],
+    'VIP Event': [('vip_retailer', RETAILERS), ('vip_total_attendance', 120),
+                  ('vip_bob', 60)],
+    'Trail building day': [('trail_building_retailer', RETAILERS),
+                           ('trail_building_total_attendance', 60)],
+    'Shop Assist': [('shop_assist_retailer', RETAILERS),
+                    ('shop_assist_description',
+                     ['Staff training', 'Floor day', 'Product launch'])],
+    'Other': [('other_activation_retailer', RETAILERS),
+              ('other_activation_description',
+               ['Group ride', 'Race support', 'Community night']),
+              ('other_activation_bob', 40)],
+}
+
+
+def _pick(rng, pool, n):
+    # Indexing an object array shares the pool's string objects, so a
+    # million rows cost a million pointers rather than a million strings.
+    pool = np.asarray(pool, dtype=object)
+    return pool[rng.integers(len(pool), size=n)]
+
+
+def raw_frame(rows, seed=0, days=730, end=None):
+    """
+    Returns rows of made-up form responses, every cell a string as in the
+    sheet, over the days up to end (default today).
+
+    Input: number of rows, random seed, length of the period in days
+    Output: Pandas DataFrame shaped like gsheet_to_df output
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or pd.Timestamp.now()).normalize()
+    dates = pd.date_range(end=end, periods=days, freq='D')
+    day = rng.integers(days, size=rows)
+    # The form is filled in during the day after the event.
+    next_days = np.asarray((dates + pd.Timedelta(days=1)).strftime('%m/%d/%Y '),
+                           dtype=object)
+    times = np.asarray([f'{s // 3600:02}:{s // 60 % 60:02}:{s % 60:02}'
+                        for s in range(8 * 3600, 20 * 3600)], dtype=object)
+
+    kinds = [k for k, _ in ACTIVATION_TYPES]
+    weights = np.array([w for _, w in ACTIVATION_TYPES])
+    kind = rng.choice(len(kinds), size=rows, p=weights / weights.sum())
+    place = rng.integers(len(PLACES), size=rows)
+    places = list(zip(*PLACES))
+
+    columns = {name: np.full(rows, '', dtype=object) for name, _ in COLUMNS}
+    columns['timestamp'] = next_days[day] + _pick(rng, times, rows)
+    columns['brand_developer'] = _pick(rng, BRAND_DEVELOPERS, rows)
+    columns['date'] = np.asarray(dates.strftime('%m/%d/%Y'), dtype=object)[day]
+    columns['activation_type'] = np.asarray(kinds, dtype=object)[kind]
+    columns['event_name'] = (np.asarray(places[0], dtype=object)[place]
+                             + ' ' + columns['activation_type'])
+    for i, name in enumerate(['Location City (closest)', 'Location State',
+                              'Location Zip Code']):
+        columns[name] = np.asarray(places[i], dtype=object)[place]
+    columns['discipline'] = _pick(rng, DISCIPLINES, rows)
+    # Events are spread up to ~30km around their town.
+    for name, center in [('latitude', 3), ('longitude', 4)]:
+        position = (np.asarray(places[center])[place]
+                    + rng.normal(0, .15, size=rows))
+        columns[name] = pd.Series(position).round(5).astype(str).values
+
+    numbers = np.asarray([str(n) for n in range(3001)], dtype=object)
+    for k, name in enumerate(kinds):
+        picked = np.flatnonzero(kind == k)
+        for column, values in ACTIVATION_COLUMNS[name]:
+            if isinstance(values, int):
+                counts = rng.integers(values + 1, size=len(picked))
+                columns[column][picked] = numbers[counts]
+            else:
+                columns[column][picked] = _pick(rng, values, len(picked))
+
+    return pd.DataFrame({f'Question {i}': columns[name]
+                         for i, (name, _) in enumerate(COLUMNS)})
+
+
+def values(rows, seed=0, days=730, end=None):
+    """
+    Returns made-up form responses as the Sheets API would: a header row
+    followed by data rows, each a list of strings without trailing blanks.
+    """
+    df = raw_frame(rows, seed, days, end)
+    data = df.values.tolist()
+    for row in data:
+        while row and row[-1] == '':
+            row.pop()
+    return [list(df.columns)] + data
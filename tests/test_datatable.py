@@ -0,0 +1,33 @@
+import pandas as pd
+
+from datatable import filter_frame, split_filter_part
+
+
+def test_split_filter_part_operators():
+    assert split_filter_part('{demo_bob} ge 10') == ('demo_bob', 'ge', 10.0)
+    assert split_filter_part('{demo_bob} >= 10') == ('demo_bob', 'ge', 10.0)
+    assert split_filter_part('{demo_bob} < 10') == ('demo_bob', 'lt', 10.0)
+    assert split_filter_part('{date} datestartswith 2020-07') == (
+        'date', 'datestartswith', '2020-07')
+
+
+def test_split_filter_part_value_holding_operator_words():
+    assert split_filter_part('{event_name} contains "Sale day"') == (
+        'event_name', 'contains', 'Sale day')
+    assert split_filter_part('{demo_retailer} contains Pine Bike Shop') == (
+        'demo_retailer', 'contains', 'Pine Bike Shop')
+    assert split_filter_part("{event_name} eq 'x >= y'") == (
+        'event_name', 'eq', 'x >= y')
+
+
+def test_split_filter_part_unreadable():
+    assert split_filter_part('{demo_bob} ge') == (None, None, None)
+    assert split_filter_part('demo_bob ge 10') == (None, None, None)
+    assert split_filter_part('{demo_bob} between 1') == (None, None, None)
+
+
+def test_filter_frame_contains_with_spaces():
+    df = pd.DataFrame({'demo_retailer': ['Pine Bike Shop', 'Mesa Cyclery',
+                                         'Pine Cyclery']})
+    rows = filter_frame(df, '{demo_retailer} contains Pine Bike Shop')
+    assert rows['demo_retailer'].tolist() == ['Pine Bike Shop']
@@ -0,0 +1,50 @@
+import pytest
+
+import sheets
+import sources
+import synthetic
+from schema import clean_rows, concat
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """ A LocalSource of 50 synthetic rows, with sync state starting over. """
+    source = sources.LocalSource(synthetic.values(50))
+    monkeypatch.setattr(sources, '_source', source)
+    monkeypatch.setattr(sheets, '_sync', {'header': None, 'rows': 0,
+                                          'last_row': None, 'since_full': 0})
+    monkeypatch.setattr(sheets, 'RANGE_NAME', 'Form Responses 1!A1:AC')
+    monkeypatch.setattr(sheets, 'INCREMENTAL_SYNC', True)
+    monkeypatch.setattr(sheets, 'FULL_SYNC_EVERY', 12)
+    return source
+
+
+def pull(df=None):
+    # What clean_main_data does with each sync.
+    values, full = sheets.sync_google_sheet()
+    if full:
+        return clean_rows(sheets.gsheet_to_df(values)), full
+    if len(values) > 1:
+        return concat([df, clean_rows(sheets.gsheet_to_df(values))]), full
+    return df, full
+
+
+def test_appended_short_rows(sheet):
+    df, full = pull()
+    assert full and len(df) == 50
+    # Blank latitude and longitude are left out of the row by the API.
+    row = synthetic.values(1, seed=1)[1][:27]
+    sheet.append([row, row[:20]])
+    df, full = pull(df)
+    assert not full and len(df) == 52
+    assert df['latitude'].isna().sum() == 2
+    df, full = pull(df)
+    assert not full and len(df) == 52
+
+
+def test_edited_last_row(sheet):
+    df, _ = pull()
+    sheet.values[-1] = sheet.values[-1][:5]
+    sheet.append([synthetic.values(1, seed=2)[1]])
+    df, full = pull(df)
+    assert full and len(df) == 51